@@ -2,11 +2,17 @@ from __future__ import annotations
 import os
 from dataclasses import dataclass
 
+def _env_flag(name: str) -> bool:
+    return (os.getenv(name) or "").strip().lower() in ("1", "true", "yes", "on")
+
 @dataclass(frozen=True)
 class AppConfig:
     discord_token: str
     database_path: str
     sync_guild_id: int | None
+    database_wal: bool = False
+    members_intent: bool = False
+    audit_log_path: str | None = None
 
     @staticmethod
     def from_env() -> "AppConfig":
@@ -16,4 +22,7 @@ class AppConfig:
         db = (os.getenv("DATABASE_PATH") or "/data/profile.db").strip() or "/data/profile.db"
         gid = (os.getenv("SYNC_GUILD_ID") or "").strip()
         sync_gid = int(gid) if gid.isdigit() else None
-        return AppConfig(token, db, sync_gid)
+        wal = _env_flag("DATABASE_WAL")
+        members = _env_flag("ENABLE_MEMBERS_INTENT")
+        audit_path = (os.getenv("AUDIT_LOG_PATH") or "").strip() or None
+        return AppConfig(token, db, sync_gid, database_wal=wal, members_intent=members, audit_log_path=audit_path)
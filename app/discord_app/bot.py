@@ -1,69 +1,231 @@
 from __future__ import annotations
 import asyncio
+import hashlib
+import json
+import time
+from datetime import timedelta
 import discord
 from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
 
 from ..config import AppConfig
+from ..models import ProfileData
 from ..storage.db import Database, utcnow
 from ..services.rate_limit import RateLimiter
-from ..services.vc_autopost import VCAutoPostLimiter, should_autopost
-from ..services.audit import make_log_line
+from ..services.vc_autopost import AutoPostBatcher, VCAutoPostLimiter, should_autopost
+from ..services.scheduler import CoalescingWorker, Debouncer, TimerHeap
+from ..services.delete_worker import ScheduledDeleteWorker
+from ..services.refresh_engine import RefreshBatch, RefreshEngine
+from ..services.display_cache import DisplayCache
+from ..services.circuit import CircuitBreaker
+from ..services.jobs import JobQueue
+from ..services.audit import AuditBatcher, AuditEvent, AuditSink, DiscordAuditSink, JsonlAuditSink
 from ..services import render
+from .deadline import DeferStats
 from .views import ProfilePanelView
 
+VC_AUTOPOST_DELAY_SEC = 10
+VC_AUTOPOST_BATCH_WINDOW_SEC = 3
+PANEL_BUMP_QUIET_SEC = 5
+REFRESH_CONCURRENCY = 4
+PROFILE_RERENDER_SETTLE_SEC = 5
+PROFILE_RERENDER_MAX_DELAY_SEC = 60
+AUDIT_FLUSH_SEC = 2
+SIDE_EFFECT_WORKERS = 4
+STALE_PANEL_DELETE_QUIET_SEC = 2
+STALE_PANEL_DELETE_MAX_DELAY_SEC = 10
+STALE_PANEL_MSG = "入口メッセージが更新されています。最新の入口を使ってください。"
+COMMAND_SYNC_CONCURRENCY = 2
+STATS_LOG_SEC = 600
+
+
+def command_tree_hash(payloads: list[dict]) -> str:
+    """Stable hash of serialized app commands, independent of registration order."""
+    ordered = sorted(payloads, key=lambda p: (p.get("type", 1), p["name"]))
+    blob = json.dumps(ordered, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def _format_metrics(name: str, metrics: dict[str, float]) -> str:
+    fields = " ".join(f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in metrics.items())
+    return f"{name}({fields})"
+
+
+def _failure_reason(e: discord.HTTPException) -> str:
+    return "not_found" if isinstance(e, discord.NotFound) else "permission"
+
 class CookieProfileBot(commands.Bot):
     def __init__(self, cfg: AppConfig):
         intents = discord.Intents.default()
         intents.guilds = True
         intents.messages = True  # needed for bump (on_message)
         intents.message_content = False
+        intents.members = cfg.members_intent  # privileged; enables on_member_update/on_user_update
 
         super().__init__(command_prefix="!", intents=intents)
         self.cfg = cfg
-        self.db = Database(cfg.database_path)
+        self.db = Database(cfg.database_path, wal=cfg.database_wal)
         self.limiter = RateLimiter()
         self.vc_autopost_limiter = VCAutoPostLimiter()
-        self._vc_autopost_tasks: dict[tuple[int, int], asyncio.Task] = {}
+        # One timer heap drives every pending VC autopost (no sleeping Task per join).
+        self.vc_autopost_timers: TimerHeap[tuple[int, int], tuple[discord.Member, discord.abc.GuildChannel]] = TimerHeap(self._fire_vc_autopost)
+        # Due autoposts are held per VC for a short window and sent as one message (up to 10 embeds).
+        self.vc_autopost_batcher: AutoPostBatcher[int, tuple[int, discord.Embed]] = AutoPostBatcher()
+        self.vc_autopost_flush_timers: TimerHeap[int, discord.abc.Messageable] = TimerHeap(self._flush_vc_autopost)
+        self.delete_worker = ScheduledDeleteWorker(self.db, self._delete_channel_messages)
+        self._refresh_sem = asyncio.Semaphore(REFRESH_CONCURRENCY)
+        self.display_cache = DisplayCache()
+        # Channels/messages that keep answering NotFound/Forbidden are skipped until their backoff expires.
+        self.circuits: CircuitBreaker[tuple[str, int]] = CircuitBreaker()
+        # Audit events go to every sink; the Discord log channel is optional per guild and
+        # packs lines per channel instead of one message per line.
+        self.audit_discord = AuditBatcher(self._send_log_chunk, interval=AUDIT_FLUSH_SEC)
+        self.audit_sinks: list[AuditSink] = [DiscordAuditSink(self.audit_discord, self.db.log_channel_for)]
+        if cfg.audit_log_path:
+            self.audit_sinks.append(JsonlAuditSink(cfg.audit_log_path))
+        # Post-response side effects (audit, public upsert, autopost sends), ordered per guild.
+        self.jobs = JobQueue(workers=SIDE_EFFECT_WORKERS)
+        self.defer_stats = DeferStats()
+        # Stale panels clicked by users, per channel; deleted in batches off the interaction path.
+        self._stale_panels: dict[int, set[int]] = {}
+        self.stale_panel_deleter: Debouncer[int] = Debouncer(
+            self._delete_stale_panels,
+            quiet=STALE_PANEL_DELETE_QUIET_SEC,
+            max_delay=STALE_PANEL_DELETE_MAX_DELAY_SEC,
+        )
+        self.refresh_engine = RefreshEngine(
+            self.db.configured_guild_ids,
+            self.refresh_profile_batch,
+            wait_ready=self.wait_until_ready,
+        )
+        # (guild_id, user_id) whose public profile may be stale after a name/avatar change.
+        self.profile_rerender: CoalescingWorker[tuple[int, int]] = CoalescingWorker(
+            self._rerender_public_profile,
+            settle=PROFILE_RERENDER_SETTLE_SEC,
+            max_delay=PROFILE_RERENDER_MAX_DELAY_SEC,
+            concurrency=REFRESH_CONCURRENCY,
+        )
+        self.panel_bumper: Debouncer[int] = Debouncer(
+            self._post_panel,
+            quiet=PANEL_BUMP_QUIET_SEC,
+            max_delay=self.limiter.limits.panel_bump_sec,
+            min_interval=self.limiter.limits.panel_bump_sec,
+        )
 
         # IMPORTANT: do not create discord.ui.View in __init__
         self.panel_view: ProfilePanelView | None = None
         self._synced_once: bool = False
+        self.startup_timings: dict[str, float] = {}
+        self._stats_task: asyncio.Task | None = None
 
     async def setup_hook(self) -> None:
         await self.db.connect()
+        for phase, sec in self.db.connect_timings.items():
+            self.startup_timings[f"db_{phase}"] = sec
+        self.vc_autopost_timers.start()
+        self.vc_autopost_flush_timers.start()
+        await self.delete_worker.start()
+        self.panel_bumper.start()
+        self.stale_panel_deleter.start()
+        self.refresh_engine.start()
+        self.profile_rerender.start()
+        self.jobs.start()
+        for sink in self.audit_sinks:
+            sink.start()
+        self._stats_task = asyncio.create_task(self._log_stats_periodically())
 
         # Register persistent view after loop is running
+        t0 = time.perf_counter()
         self.panel_view = ProfilePanelView(self)
         self.add_view(self.panel_view)
-
+        self.startup_timings["views"] = time.perf_counter() - t0
 
     async def on_ready(self) -> None:
-        # Force sync once to eliminate CommandSignatureMismatch caused by stale Discord command definitions.
+        # Sync once per process; scopes whose command tree is unchanged since the last sync are skipped.
         if self._synced_once:
             return
         self._synced_once = True
 
-        try:
-            if self.cfg.sync_guild_id:
-                g = discord.Object(id=self.cfg.sync_guild_id)
-                self.tree.copy_global_to(guild=g)
-                await self.tree.sync(guild=g)
-            else:
-                # Sync per guild for fast propagation (safe if bot is in few guilds).
-                for g0 in list(self.guilds):
-                    g = discord.Object(id=g0.id)
-                    self.tree.copy_global_to(guild=g)
-                    await self.tree.sync(guild=g)
-
-            # Also sync global (may take longer to propagate)
-            await self.tree.sync()
-        except Exception as e:
-            print(f"[ProfileBot] command sync failed: {e!r}")
+        t0 = time.perf_counter()
+        guild_ids = [self.cfg.sync_guild_id] if self.cfg.sync_guild_id else [g.id for g in self.guilds]
+        synced, total = await self.sync_commands(guild_ids, include_global=True)
+        self.startup_timings["command_sync"] = time.perf_counter() - t0
+        phases = " ".join(f"{k}={v * 1000:.0f}ms" for k, v in self.startup_timings.items())
+        print(f"[ProfileBot] startup {phases} (synced {synced}/{total} command scopes)")
+
+    async def on_guild_join(self, guild: discord.Guild) -> None:
+        if not self.cfg.sync_guild_id:
+            await self.sync_commands([guild.id], include_global=False)
+
+    async def format_stats(self) -> str:
+        """One operator-facing snapshot of the queues, caches and per-query DB latency."""
+        parts = [
+            _format_metrics("jobs", self.jobs.metrics()),
+            _format_metrics("deletes", await self.delete_worker.metrics()),
+            _format_metrics("display", self.display_cache.stats()),
+            _format_metrics("guild_cfg", self.db.guild_config_cache_stats()),
+        ]
+        parts += [_format_metrics(f"defer:{name}", st) for name, st in sorted(self.defer_stats.snapshot().items())]
+        lines = [f"[ProfileBot] stats {' '.join(parts)}"]
+        lines += [f"  {q}" for q in self.db.format_query_stats().splitlines()]
+        return "\n".join(lines)
+
+    async def _log_stats_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(STATS_LOG_SEC)
+            try:
+                print(await self.format_stats())
+            except Exception as e:
+                print(f"[ProfileBot] stats failed: {e!r}")
+
+    async def sync_commands(self, guild_ids: list[int], *, include_global: bool) -> tuple[int, int]:
+        """
+        Sync the command tree to each guild (and globally) only where its hash differs from
+        the one stored after the last successful sync. Returns (synced, total) scopes.
+        """
+        stored = await self.db.get_command_sync_hashes()
+        sem = asyncio.Semaphore(COMMAND_SYNC_CONCURRENCY)
+        synced = 0
+
+        async def _one(scope: str, guild: discord.Object | None) -> None:
+            nonlocal synced
+            if guild is not None:
+                self.tree.copy_global_to(guild=guild)
+            tree_hash = command_tree_hash([c.to_dict(self.tree) for c in self.tree.get_commands(guild=guild)])
+            if stored.get(scope) == tree_hash:
+                return
+            try:
+                async with sem:
+                    await self.tree.sync(guild=guild)
+            except Exception as e:
+                print(f"[ProfileBot] command sync failed for {scope}: {e!r}")
+                return
+            await self.db.set_command_sync_hash(scope, tree_hash)
+            synced += 1
+
+        scopes: list[tuple[str, discord.Object | None]] = [(f"guild:{gid}", discord.Object(id=gid)) for gid in guild_ids]
+        if include_global:
+            scopes.append(("global", None))
+        await asyncio.gather(*(_one(scope, guild) for scope, guild in scopes))
+        return synced, len(scopes)
 
     async def close(self) -> None:
         try:
+            if self._stats_task is not None:
+                self._stats_task.cancel()
+                await asyncio.gather(self._stats_task, return_exceptions=True)
+            # Stop everything that submits jobs or audit events first, so nothing lands after the drain.
+            await self.vc_autopost_timers.stop()
+            await self.vc_autopost_flush_timers.stop()
+            await self.panel_bumper.stop()
+            await self.stale_panel_deleter.stop()
+            await self.profile_rerender.stop()
+            await self.refresh_engine.stop()
+            await self.delete_worker.stop()
+            await self.jobs.stop()  # drain queued side effects while the DB and audit sinks are still up
+            for sink in self.audit_sinks:  # flush what the workers above left behind
+                await sink.stop()
             await self.db.close()
         finally:
             await super().close()
@@ -72,10 +234,7 @@ class CookieProfileBot(commands.Bot):
         gid = interaction.guild_id
         if gid is None:
             return
-        cfg = await self.db.get_guild_config(gid)
-        if not cfg.log_channel_id:
-            return
-        line = make_log_line(
+        event = AuditEvent(
             ts=utcnow(),
             guild_id=gid,
             user_id=interaction.user.id,
@@ -84,12 +243,7 @@ class CookieProfileBot(commands.Bot):
             result=result,
             reason=reason,
         )
-        ch = self.get_channel(cfg.log_channel_id)
-        if ch:
-            try:
-                await ch.send(line)
-            except Exception:
-                pass
+        self._emit_audit(event)
 
     async def audit_system(
         self,
@@ -101,9 +255,7 @@ class CookieProfileBot(commands.Bot):
         reason: str | None,
     ) -> None:
         cfg = await self.db.get_guild_config(guild_id)
-        if not cfg.log_channel_id:
-            return
-        line = make_log_line(
+        event = AuditEvent(
             ts=utcnow(),
             guild_id=guild_id,
             user_id=user_id,
@@ -112,12 +264,46 @@ class CookieProfileBot(commands.Bot):
             result=result,
             reason=reason,
         )
-        ch = self.get_channel(cfg.log_channel_id)
-        if ch:
-            try:
-                await ch.send(line)
-            except Exception:
-                pass
+        self._emit_audit(event)
+
+    def audit_later(self, interaction: discord.Interaction, *, action: str, result: str, reason: str | None) -> None:
+        self.jobs.submit(interaction.guild_id, "audit", lambda: self.audit(interaction, action=action, result=result, reason=reason))
+
+    def upsert_public_profile_later(self, interaction: discord.Interaction) -> None:
+        self.jobs.submit(interaction.guild_id, "upsert_public_profile", lambda: self.upsert_public_profile(interaction))
+
+    def _emit_audit(self, event: AuditEvent) -> None:
+        for sink in self.audit_sinks:
+            sink.emit(event)
+
+    async def _send_log_chunk(self, log_channel_id: int, text: str) -> None:
+        key = ("channel", log_channel_id)
+        if not self.circuits.allow(key):
+            return
+        ch = self.get_channel(log_channel_id)
+        if not ch:
+            return
+        try:
+            await ch.send(text)
+            self.circuits.record_success(key)
+        except (discord.NotFound, discord.Forbidden) as e:
+            # Cannot report this one through the log channel itself.
+            if self.circuits.record_failure(key, _failure_reason(e)):
+                print(f"[ProfileBot] log channel {log_channel_id} unavailable ({_failure_reason(e)}); audit lines paused")
+        except Exception:
+            pass
+
+    async def _note_failure(self, guild_id: int, key: tuple[str, int], e: discord.HTTPException) -> None:
+        """Track a NotFound/Forbidden; the audit log hears about it once, when the circuit opens."""
+        reason = _failure_reason(e)
+        if self.circuits.record_failure(key, reason):
+            await self.audit_system(
+                guild_id=guild_id,
+                user_id=0,
+                action="circuit_open",
+                result="ng",
+                reason=f"{key[0]}={key[1]} {reason}",
+            )
 
     async def _resolve_profile_display(
         self,
@@ -127,40 +313,99 @@ class CookieProfileBot(commands.Bot):
         fallback_title: str | None,
     ) -> tuple[str, str | None]:
         guild = self.get_guild(guild_id)
-        if guild:
-            member = guild.get_member(user_id)
-            if member is None:
-                try:
-                    member = await guild.fetch_member(user_id)
-                except Exception:
-                    member = None
-            if member:
+        member = guild.get_member(user_id) if guild else None
+        if member:
+            avatar_url = member.display_avatar.url if member.display_avatar else None
+            return member.display_name, avatar_url
+
+        found, display = self.display_cache.get(guild_id, user_id)
+        if not found:
+            display, cacheable = await self._fetch_profile_display(guild, user_id)
+            if cacheable:
+                self.display_cache.put(guild_id, user_id, display)
+        if display is not None:
+            return display
+
+        if fallback_title and fallback_title.endswith("さんのプロフィール"):
+            return fallback_title.replace("さんのプロフィール", ""), None
+
+        return f"User {user_id}", None
+
+    async def _fetch_profile_display(
+        self,
+        guild: discord.Guild | None,
+        user_id: int,
+    ) -> tuple[tuple[str, str | None] | None, bool]:
+        """REST fallback. Returns (display or None, whether the answer may be cached)."""
+        if guild and self.display_cache.is_not_member(guild.id, user_id):
+            self.display_cache.not_member_skips += 1  # a member query already came back without them
+        elif guild:
+            self.display_cache.rest_calls += 1
+            try:
+                member = await guild.fetch_member(user_id)
                 avatar_url = member.display_avatar.url if member.display_avatar else None
-                return member.display_name, avatar_url
+                return (member.display_name, avatar_url), True
+            except Exception:
+                pass
 
+        self.display_cache.rest_calls += 1
         try:
             user = await self.fetch_user(user_id)
+        except discord.NotFound:
+            return None, True  # deleted account: cache the miss
         except Exception:
-            user = None
-        if user:
-            avatar_url = user.display_avatar.url if user.display_avatar else None
-            return user.name, avatar_url
-
-        if fallback_title and fallback_title.endswith("さんのプロフィール"):
-            return fallback_title.replace("さんのプロフィール", ""), None
+            return None, False
+        avatar_url = user.display_avatar.url if user.display_avatar else None
+        return (user.name, avatar_url), True
 
-        return f"User {user_id}", None
+    async def _prefetch_profile_displays(self, guild_id: int, user_ids: list[int]) -> None:
+        """Resolve a refresh batch's uncached members with one gateway query per 100 ids."""
+        guild = self.get_guild(guild_id)
+        if guild is None:
+            return
+        wanted = [
+            uid for uid in user_ids
+            if guild.get_member(uid) is None and (guild_id, uid) not in self.display_cache
+        ]
+        for i in range(0, len(wanted), 100):
+            chunk = wanted[i:i + 100]
+            try:
+                members = await guild.query_members(user_ids=chunk, limit=len(chunk), cache=False)
+            except Exception:
+                return  # per-profile REST fallback still applies
+            found = set()
+            for member in members:
+                avatar_url = member.display_avatar.url if member.display_avatar else None
+                self.display_cache.put(guild_id, member.id, (member.display_name, avatar_url))
+                found.add(member.id)
+            self.display_cache.gateway_resolved += len(members)
+            for uid in chunk:
+                if uid not in found:
+                    self.display_cache.mark_not_member(guild_id, uid)
+
+    def _messageable(self, channel_id: int, *, guild_id: int | None = None) -> discord.abc.Messageable:
+        """
+        Channel to send/edit/delete in without an HTTP lookup: the cached channel if any,
+        otherwise a partial one built from the stored id. Callers handle NotFound on use.
+        """
+        return self.get_channel(channel_id) or self.get_partial_messageable(channel_id, guild_id=guild_id)
 
     async def refresh_public_profiles(self, guild_id: int, *, limit: int = 50) -> int:
+        return (await self.refresh_profile_batch(guild_id, limit)).edited
+
+    async def refresh_profile_batch(self, guild_id: int, limit: int) -> RefreshBatch:
+        """
+        Re-render the next `limit` public profiles after the guild's checkpoint, with at most
+        REFRESH_CONCURRENCY edits in flight bot-wide. A short batch means the end was reached:
+        the cursor wraps to 0 so the next pass starts over.
+        """
+        if self.get_guild(guild_id) is None:
+            # Not in the gateway cache (yet): display names would fall back to global usernames.
+            return RefreshBatch(visited=0, edited=0, wrapped=True)
         cfg = await self.db.get_guild_config(guild_id)
-        if not cfg.channel_id:
-            return 0
-        ch = self.get_channel(cfg.channel_id)
-        if ch is None:
-            try:
-                ch = await self.fetch_channel(cfg.channel_id)
-            except Exception:
-                return 0
+        if not cfg.channel_id or self.circuits.is_open(("channel", cfg.channel_id)):
+            return RefreshBatch(visited=0, edited=0, wrapped=True)
+        ch = self._messageable(cfg.channel_id, guild_id=guild_id)
 
         cursor = await self.db.get_profile_refresh_cursor(guild_id)
         profiles = await self.db.list_public_profiles_for_refresh(
@@ -168,46 +413,32 @@ class CookieProfileBot(commands.Bot):
             after_message_id=cursor,
             limit=limit,
         )
-        if not profiles:
-            return 0
-
-        last_message_id = cursor
-        refreshed = 0
-        for prof in profiles:
-            msg_id = prof.public_message_id
-            if not msg_id:
-                continue
-            if msg_id > last_message_id:
-                last_message_id = msg_id
-            try:
-                msg = await ch.fetch_message(msg_id)
-            except discord.NotFound:
-                await self.audit_system(
-                    guild_id=guild_id,
-                    user_id=prof.user_id,
-                    action="refresh_public_profile",
-                    result="ng",
-                    reason="not_found",
-                )
-                continue
-            except discord.Forbidden:
-                await self.audit_system(
-                    guild_id=guild_id,
-                    user_id=prof.user_id,
-                    action="refresh_public_profile",
-                    result="ng",
-                    reason="permission",
-                )
-                continue
-            except Exception:
-                continue
-
+        await self._prefetch_profile_displays(guild_id, [p.user_id for p in profiles])
+        results = await asyncio.gather(*(self._refresh_public_profile(ch, prof) for prof in profiles))
+
+        wrapped = len(profiles) < limit
+        last_message_id = 0 if wrapped else max(p.public_message_id or 0 for p in profiles)
+        if last_message_id != cursor:
+            await self.db.set_profile_refresh_cursor(guild_id, last_message_id)
+        return RefreshBatch(visited=len(profiles), edited=sum(results), wrapped=wrapped)
+
+    async def _refresh_public_profile(self, ch: discord.abc.Messageable, prof: ProfileData) -> bool:
+        msg_id = prof.public_message_id
+        if not msg_id:
+            return False
+        guild_id = prof.guild_id
+        channel_key = ("channel", ch.id)
+        message_key = ("message", msg_id)
+        async with self._refresh_sem:
+            # Checked once a slot is held: the circuit may have opened while this call waited.
+            if not self.circuits.allow(channel_key) or not self.circuits.allow(message_key):
+                return False
             display_name, avatar_url = await self._resolve_profile_display(
                 guild_id=guild_id,
                 user_id=prof.user_id,
-                fallback_title=msg.embeds[0].title if msg.embeds else None,
+                fallback_title=None,
             )
-            emb = render.build_profile_embed(
+            fields = dict(
                 display_name=display_name,
                 avatar_url=avatar_url,
                 name=prof.name,
@@ -216,161 +447,224 @@ class CookieProfileBot(commands.Bot):
                 care=prof.care,
                 one=prof.one,
             )
+            fingerprint = render.profile_fingerprint(**fields)
+            if fingerprint == prof.public_content_hash:
+                return False  # already showing exactly this
+            emb = render.build_profile_embed(**fields)
             try:
-                await msg.edit(embed=emb)
-                refreshed += 1
-            except discord.NotFound:
-                await self.audit_system(
-                    guild_id=guild_id,
-                    user_id=prof.user_id,
-                    action="refresh_public_profile",
-                    result="ng",
-                    reason="not_found",
-                )
-            except discord.Forbidden:
-                await self.audit_system(
-                    guild_id=guild_id,
-                    user_id=prof.user_id,
-                    action="refresh_public_profile",
-                    result="ng",
-                    reason="permission",
-                )
+                # Edit by id; a missing message surfaces as NotFound here instead of on a prior GET.
+                await ch.get_partial_message(msg_id).edit(embed=emb)
+            except discord.NotFound as e:
+                await self._note_failure(guild_id, message_key, e)
+                return False
+            except discord.Forbidden as e:
+                await self._note_failure(guild_id, channel_key, e)
+                return False
             except Exception:
-                pass
+                return False
+            self.circuits.record_success(message_key)
+            self.circuits.record_success(channel_key)
+            await self.db.set_public_content_hash(guild_id, prof.user_id, fingerprint)
+            return True
+
+    async def _rerender_public_profile(self, key: tuple[int, int]) -> None:
+        guild_id, user_id = key
+        cfg = await self.db.get_guild_config(guild_id)
+        if not cfg.channel_id:
+            return
+        prof = await self.db.peek_profile(guild_id, user_id)
+        if prof is None or not prof.public_message_id:
+            return
+        await self._refresh_public_profile(self._messageable(cfg.channel_id, guild_id=guild_id), prof)
 
-        await self.db.set_profile_refresh_cursor(guild_id, last_message_id)
-        return refreshed
+    async def on_member_update(self, before: discord.Member, after: discord.Member) -> None:
+        if after.bot or not self.db.has_profile_channel(after.guild.id):
+            return
+        if before.display_name != after.display_name or before.display_avatar.url != after.display_avatar.url:
+            self.display_cache.invalidate(after.guild.id, after.id)
+            self.profile_rerender.mark((after.guild.id, after.id))
 
-    async def delete_if_old_panel(self, interaction: discord.Interaction) -> None:
-        gid = interaction.guild_id
-        if gid is None or not interaction.message:
+    async def on_user_update(self, before: discord.User, after: discord.User) -> None:
+        # Global name/avatar changes show in every guild where no per-guild override applies.
+        if after.bot:
             return
-        cfg = await self.db.get_guild_config(gid)
-        latest = cfg.panel_message_id
-        if latest and interaction.message.id != latest:
+        if before.display_name == after.display_name and before.display_avatar.url == after.display_avatar.url:
+            return
+        for guild in after.mutual_guilds:
+            if self.db.has_profile_channel(guild.id):
+                self.display_cache.invalidate(guild.id, after.id)
+                self.profile_rerender.mark((guild.id, after.id))
+
+    async def _delete_channel_messages(self, channel_id: int, message_ids: list[int]) -> None:
+        """Delete messages by id without fetching the channel; bulk-delete where Discord allows it."""
+        # Bulk delete rejects messages older than 14 days; keep a margin for clock skew.
+        cutoff = utcnow() - timedelta(days=13, hours=23)
+        bulk = [mid for mid in message_ids if discord.utils.snowflake_time(mid) > cutoff]
+        single = [mid for mid in message_ids if mid not in bulk]
+        if len(bulk) >= 2:
             try:
-                await interaction.message.delete()
-            except Exception:
+                await self.http.delete_messages(channel_id, bulk)
+                bulk = []
+            except discord.NotFound:
+                return  # channel gone: nothing left to delete
+            except discord.HTTPException:
+                # No Manage Messages (403) or a transient error: the bot can still delete its own
+                # messages one at a time.
                 pass
+        for mid in bulk + single:
             try:
-                await interaction.followup.send("入口メッセージが更新されています。最新の入口を使ってください。", ephemeral=True)
-            except Exception:
+                await self.http.delete_message(channel_id, mid)
+            except (discord.NotFound, discord.Forbidden):
                 pass
 
-    async def ensure_sticky_panel(self, guild_id: int) -> None:
-        await self._post_panel(guild_id, rate_limited=False)
+    def check_stale_panel(self, interaction: discord.Interaction) -> bool:
+        """
+        In-memory check of the clicked message against the cached latest panel id.
+        A stale panel is queued for background deletion; nothing here awaits.
+        """
+        gid = interaction.guild_id
+        msg = interaction.message
+        if gid is None or msg is None or not self.db.is_stale_panel(gid, msg.id):
+            return False
+        self._stale_panels.setdefault(msg.channel.id, set()).add(msg.id)
+        self.stale_panel_deleter.request(msg.channel.id)
+        return True
+
+    def notify_stale_panel_later(self, interaction: discord.Interaction) -> None:
+        # Sent as a followup once the handler has answered.
+        self.jobs.submit(interaction.guild_id, "stale_panel_notice", lambda: interaction.followup.send(STALE_PANEL_MSG, ephemeral=True))
+
+    async def _delete_stale_panels(self, channel_id: int) -> None:
+        ids = self._stale_panels.pop(channel_id, None)
+        if ids:
+            await self._delete_channel_messages(channel_id, sorted(ids))
 
     async def bump_panel(self, guild_id: int) -> None:
         """
         Bump (move) the entry panel to the bottom by re-sending it.
         This creates a new message ID, so we update panel_message_id accordingly.
-        Rate-limited via RateLimiter (panel_bump).
+        Debounced per guild: fires once the channel has been quiet for a few seconds
+        (capped by RateLimits.panel_bump_sec), at most one bump per panel_bump_sec and never
+        more than one bump per guild at a time.
         """
-        await self._post_panel(guild_id, rate_limited=True)
+        self.panel_bumper.request(guild_id)
 
-    async def _post_panel(self, guild_id: int, *, rate_limited: bool) -> None:
+    async def _post_panel(self, guild_id: int) -> None:
         cfg = await self.db.get_guild_config(guild_id)
         if not cfg.channel_id:
             return
 
-        # guild-level rate limit (use user_id=0 as system key)
-        if rate_limited and not self.limiter.allow(guild_id, 0, "panel_bump"):
+        channel_key = ("channel", cfg.channel_id)
+        if not self.circuits.allow(channel_key):
             return
-
-        ch = self.get_channel(cfg.channel_id)
-        if ch is None:
-            try:
-                ch = await self.fetch_channel(cfg.channel_id)
-            except Exception:
-                return
+        ch = self._messageable(cfg.channel_id, guild_id=guild_id)
 
         # Send new panel first (so we never end up with none), then delete old (best-effort).
         emb = render.build_panel_embed()
         try:
             new_msg = await ch.send(embed=emb, view=self.panel_view)
+        except (discord.NotFound, discord.Forbidden) as e:
+            await self._note_failure(guild_id, channel_key, e)
+            return
         except Exception:
             return
+        self.circuits.record_success(channel_key)
 
         # Try delete old panel message to avoid duplicates (requires Manage Messages).
         if cfg.panel_message_id:
             try:
-                old_msg = await ch.fetch_message(cfg.panel_message_id)
-                await old_msg.delete()
+                await ch.get_partial_message(cfg.panel_message_id).delete()
             except Exception:
                 pass
 
         await self.db.set_panel_message_id(guild_id, new_msg.id)
 
     async def on_message(self, message: discord.Message) -> None:
-        # bump only when a human posts in the configured channel
-        if message.guild is None:
+        # bump only when a human posts in the configured channel.
+        # Checked against the in-memory channel index first: most messages are elsewhere.
+        gid = self.db.guild_for_profile_channel(message.channel.id)
+        if gid is None:
+            return
+        if message.guild is None or message.guild.id != gid:
             return
         if message.author.bot:
             return
 
-        cfg = await self.db.get_guild_config(message.guild.id)
-        if not cfg.channel_id:
-            return
-        if message.channel.id != cfg.channel_id:
-            return
+        cfg = await self.db.get_guild_config(gid)
 
         # Do not bump if the panel is already the newest message (common when just deployed)
         if cfg.panel_message_id and message.id == cfg.panel_message_id:
             return
 
-        await self.bump_panel(message.guild.id)
+        await self.bump_panel(gid)
 
     async def _schedule_vc_autopost(self, member: discord.Member, channel: discord.abc.GuildChannel) -> None:
-        key = (member.guild.id, member.id)
-        existing = self._vc_autopost_tasks.get(key)
-        if existing:
-            existing.cancel()
+        # Re-joining replaces the pending timer for this member.
+        self.vc_autopost_timers.schedule((member.guild.id, member.id), VC_AUTOPOST_DELAY_SEC, (member, channel))
 
-        async def delayed_post() -> None:
-            try:
-                await asyncio.sleep(10)
-                current = member.voice
-                if current is None or current.channel is None or current.channel.id != channel.id:
-                    return
-                if not self.vc_autopost_limiter.allow(member.guild.id, member.id, channel.id):
-                    return
-                prof = await self.db.get_profile(member.guild.id, member.id)
-                if not should_autopost(prof):
-                    return
-                if not (prof.name or "").strip():
-                    return
-                emb = render.build_profile_embed(
-                    display_name=member.display_name,
-                    avatar_url=member.display_avatar.url if member.display_avatar else None,
-                    name=prof.name,
-                    condition=prof.condition,
-                    hobby=prof.hobby,
-                    care=prof.care,
-                    one=prof.one,
-                )
-                target = None
-                if hasattr(channel, "send"):
-                    target = channel
-                else:
-                    text_channel = getattr(channel, "text_channel", None)
-                    if text_channel:
-                        target = text_channel
-                if target is None:
-                    return
-                try:
-                    await target.send(
-                        content=f"🍪Profile <@{member.id}>",
-                        embed=emb,
-                        allowed_mentions=discord.AllowedMentions.none(),
-                    )
-                except Exception:
-                    return
-            finally:
-                if self._vc_autopost_tasks.get(key) is task:
-                    self._vc_autopost_tasks.pop(key, None)
-
-        task = asyncio.create_task(delayed_post())
-        self._vc_autopost_tasks[key] = task
+    async def _fire_vc_autopost(
+        self,
+        key: tuple[int, int],
+        target: tuple[discord.Member, discord.abc.GuildChannel],
+    ) -> None:
+        member, channel = target
+        current = member.voice
+        if current is None or current.channel is None or current.channel.id != channel.id:
+            return
+        if not self.vc_autopost_limiter.allow(member.guild.id, member.id, channel.id):
+            return
+        prof = await self.db.peek_profile(member.guild.id, member.id)
+        if prof is None or not should_autopost(prof):
+            return
+        if not (prof.name or "").strip():
+            return
+        emb = render.build_profile_embed(
+            display_name=member.display_name,
+            avatar_url=member.display_avatar.url if member.display_avatar else None,
+            name=prof.name,
+            condition=prof.condition,
+            hobby=prof.hobby,
+            care=prof.care,
+            one=prof.one,
+        )
+        dest = None
+        if hasattr(channel, "send"):
+            dest = channel
+        else:
+            text_channel = getattr(channel, "text_channel", None)
+            if text_channel:
+                dest = text_channel
+        if dest is None:
+            return
+
+        # Coalesce members who became due together into one message per VC.
+        first = self.vc_autopost_batcher.pending(channel.id) == 0
+        full = self.vc_autopost_batcher.add(channel.id, (member.id, emb))
+        if full is not None:
+            self.vc_autopost_flush_timers.cancel(channel.id)
+            self.jobs.submit(member.guild.id, "vc_autopost", lambda: self._send_vc_autopost_batch(dest, full))
+        elif first:
+            self.vc_autopost_flush_timers.schedule(channel.id, VC_AUTOPOST_BATCH_WINDOW_SEC, dest)
+
+    async def _flush_vc_autopost(self, vc_id: int, dest: discord.abc.Messageable) -> None:
+        batch = self.vc_autopost_batcher.take(vc_id)
+        if batch:
+            gid = getattr(getattr(dest, "guild", None), "id", None)
+            self.jobs.submit(gid, "vc_autopost", lambda: self._send_vc_autopost_batch(dest, batch))
+
+    async def _send_vc_autopost_batch(
+        self,
+        dest: discord.abc.Messageable,
+        batch: list[tuple[int, discord.Embed]],
+    ) -> None:
+        try:
+            await dest.send(
+                content="🍪Profile " + " ".join(f"<@{uid}>" for uid, _ in batch),
+                embeds=[emb for _, emb in batch],
+                allowed_mentions=discord.AllowedMentions.none(),
+            )
+        except Exception:
+            return
 
     async def on_voice_state_update(
         self,
@@ -384,10 +678,7 @@ class CookieProfileBot(commands.Bot):
         after_ch = after.channel
         if before_ch is not None and after_ch is not None and before_ch.id == after_ch.id:
             return
-        key = (member.guild.id, member.id)
-        existing = self._vc_autopost_tasks.get(key)
-        if existing:
-            existing.cancel()
+        self.vc_autopost_timers.cancel((member.guild.id, member.id))
         if after_ch is None:
             return
         await self._schedule_vc_autopost(member, after_ch)
@@ -399,16 +690,16 @@ class CookieProfileBot(commands.Bot):
         cfg = await self.db.get_guild_config(gid)
         if not cfg.channel_id:
             return
+        channel_key = ("channel", cfg.channel_id)
+        if not self.circuits.allow(channel_key):
+            return
 
-        ch = self.get_channel(cfg.channel_id)
-        if ch is None:
-            try:
-                ch = await self.fetch_channel(cfg.channel_id)
-            except Exception:
-                return
+        ch = self._messageable(cfg.channel_id, guild_id=gid)
 
-        prof = await self.db.get_profile(gid, interaction.user.id)
-        emb = render.build_profile_embed(
+        prof = await self.db.peek_profile(gid, interaction.user.id)
+        if prof is None:
+            return
+        fields = dict(
             display_name=interaction.user.display_name,
             avatar_url=interaction.user.display_avatar.url if interaction.user.display_avatar else None,
             name=prof.name,
@@ -417,29 +708,40 @@ class CookieProfileBot(commands.Bot):
             care=prof.care,
             one=prof.one,
         )
+        fingerprint = render.profile_fingerprint(**fields)
+        emb = render.build_profile_embed(**fields)
 
         # Create if missing
         if not prof.public_message_id:
             try:
                 msg = await ch.send(content=f"🍪Profile <@{interaction.user.id}>", embed=emb, allowed_mentions=discord.AllowedMentions(users=[interaction.user]))
-                await self.db.set_public_message_id(gid, interaction.user.id, msg.id)
+                await self.db.set_public_message_id(gid, interaction.user.id, msg.id, content_hash=fingerprint)
                 await self.bump_panel(gid)
                 return
+            except (discord.NotFound, discord.Forbidden) as e:
+                await self._note_failure(gid, channel_key, e)
+                return
             except Exception:
                 return
 
+        # Saved without visible changes: the posted message is already up to date.
+        if prof.public_content_hash == fingerprint:
+            return
+
         # Edit; recover if deleted
         try:
-            msg = await ch.fetch_message(prof.public_message_id)
-            await msg.edit(content=f"🍪Profile <@{interaction.user.id}>", embed=emb, allowed_mentions=discord.AllowedMentions(users=[interaction.user]))
+            await ch.get_partial_message(prof.public_message_id).edit(content=f"🍪Profile <@{interaction.user.id}>", embed=emb, allowed_mentions=discord.AllowedMentions(users=[interaction.user]))
+            await self.db.set_public_content_hash(gid, interaction.user.id, fingerprint)
             await self.bump_panel(gid)
         except discord.NotFound:
             try:
                 msg = await ch.send(content=f"🍪Profile <@{interaction.user.id}>", embed=emb, allowed_mentions=discord.AllowedMentions(users=[interaction.user]))
-                await self.db.set_public_message_id(gid, interaction.user.id, msg.id)
+                await self.db.set_public_message_id(gid, interaction.user.id, msg.id, content_hash=fingerprint)
                 await self.bump_panel(gid)
-            except Exception:
-                return
+            except (discord.NotFound, discord.Forbidden) as e:
+                await self._note_failure(gid, channel_key, e)
+        except discord.Forbidden as e:
+            await self._note_failure(gid, channel_key, e)
         except Exception:
             return
 
@@ -465,26 +767,43 @@ class SetupCommands(app_commands.Group):
         # Read existing config BEFORE overwriting, so we can clean up old panel in a different channel (best effort).
         old_cfg = await self.bot.db.get_guild_config(gid)
 
-        # Persist new target channel (and optional log channel)
-        await self.bot.db.set_guild_config(
-            gid,
-            channel_id=channel.id,
-            log_channel_id=log_channel.id if log_channel else None,
-        )
-
         # If the panel existed in a previous channel and the channel changed, delete the old one (requires permissions).
         if old_cfg.panel_message_id and old_cfg.channel_id and old_cfg.channel_id != channel.id:
             try:
-                old_ch = self.bot.get_channel(old_cfg.channel_id) or await self.bot.fetch_channel(old_cfg.channel_id)
-                old_msg = await old_ch.fetch_message(old_cfg.panel_message_id)
-                await old_msg.delete()
+                old_ch = self.bot._messageable(old_cfg.channel_id, guild_id=gid)
+                await old_ch.get_partial_message(old_cfg.panel_message_id).delete()
             except Exception:
                 pass
 
-        # Post new panel and remove old one (best-effort)
-        await self.bot.ensure_sticky_panel(gid)
+        # Post new panel first, then persist target channel (+ optional log channel) and panel id in one commit.
+        try:
+            new_msg = await channel.send(embed=render.build_panel_embed(), view=self.bot.panel_view)
+        except Exception:
+            new_msg = None
+        else:
+            # The send proves access was fixed; don't keep short-circuiting this channel until the backoff ends.
+            self.bot.circuits.record_success(("channel", channel.id))
+        if log_channel is not None:
+            self.bot.circuits.record_success(("channel", log_channel.id))
+        async with self.bot.db.transaction(name="profilesetup_run") as tx:
+            await self.bot.db.set_guild_config(
+                gid,
+                channel_id=channel.id,
+                log_channel_id=log_channel.id if log_channel else None,
+                tx=tx,
+            )
+            if new_msg is not None:
+                await self.bot.db.set_panel_message_id(gid, new_msg.id, tx=tx)
+
+        # Remove the previous panel in the same channel (best-effort).
+        if new_msg is not None and old_cfg.panel_message_id and old_cfg.channel_id == channel.id:
+            try:
+                await channel.get_partial_message(old_cfg.panel_message_id).delete()
+            except Exception:
+                pass
 
-        await self.bot.refresh_public_profiles(gid, limit=50)
+        # Re-render public profiles in the background (new channel / first setup).
+        self.bot.refresh_engine.kick()
         await interaction.followup.send("入口メッセージを設置/更新しました。", ephemeral=True)
 
 
@@ -0,0 +1,148 @@
+from __future__ import annotations
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Callable
+import discord
+
+INTERACTION_DEADLINE_SEC = 3.0
+DEFER_AT_SEC = 2.0  # defer once elapsed + the step's expected cost would reach this
+STEP_ESTIMATE_ALPHA = 0.2
+
+@dataclass
+class HandlerStats:
+    calls: int = 0
+    deferred: int = 0
+    late: int = 0  # first response still went out after the deadline
+
+class DeferStats:
+    """
+    Per-handler defer counters plus a per-step latency estimate. The estimate jumps up to
+    a slow observation immediately and decays back slowly, so one slow DB call makes the
+    next few interactions defer early instead of racing the deadline.
+    """
+    def __init__(self):
+        self._handlers: dict[str, HandlerStats] = {}
+        self._estimates: dict[tuple[str, str], float] = {}
+
+    def handler(self, name: str) -> HandlerStats:
+        return self._handlers.setdefault(name, HandlerStats())
+
+    def estimate(self, handler: str, step: str) -> float:
+        return self._estimates.get((handler, step), 0.0)
+
+    def observe(self, handler: str, step: str, sec: float) -> None:
+        key = (handler, step)
+        prev = self._estimates.get(key)
+        if prev is None or sec > prev:
+            self._estimates[key] = sec
+        else:
+            self._estimates[key] = prev + STEP_ESTIMATE_ALPHA * (sec - prev)
+
+    def snapshot(self) -> dict[str, dict[str, int]]:
+        return {name: asdict(s) for name, s in self._handlers.items()}
+
+class ResponseBudget:
+    """
+    Latency budget for one interaction. Wrap slow work in `async with budget.step(name)`:
+    if the time spent so far plus that step's expected cost would cross `defer_at`, the
+    interaction is deferred first; a step still running when `defer_at` is reached is
+    deferred from a timer. Either way send() then switches to a followup.
+    Modals must be the initial response and cannot follow a defer, so handlers that end
+    in send_modal use can_defer=False and only get counted.
+    """
+    def __init__(
+        self,
+        interaction: discord.Interaction,
+        handler: str,
+        stats: DeferStats,
+        *,
+        ephemeral: bool = True,
+        can_defer: bool = True,
+        defer_at: float = DEFER_AT_SEC,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.interaction = interaction
+        self.handler = handler
+        self.ephemeral = ephemeral
+        self.can_defer = can_defer
+        self.defer_at = defer_at
+        self._stats = stats
+        self._clock = clock
+        # Discord's deadline runs from interaction creation, so gateway/queueing lag before this
+        # handler started counts against the budget too.
+        lag = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+        self._started = clock() - max(0.0, lag)
+        self._responded = False
+        self._defer_task: asyncio.Task | None = None
+        self.deferred = False
+        stats.handler(handler).calls += 1
+
+    @property
+    def elapsed(self) -> float:
+        return self._clock() - self._started
+
+    @asynccontextmanager
+    async def step(self, name: str) -> AsyncIterator[None]:
+        timer: asyncio.TimerHandle | None = None
+        if self.can_defer:
+            await self._maybe_defer(self._stats.estimate(self.handler, name))
+            if not self._settled():
+                # The estimate may be stale or missing (first call after start): also defer if
+                # the step is still running when the threshold is reached.
+                timer = asyncio.get_running_loop().call_later(
+                    max(0.0, self.defer_at - self.elapsed), self._defer_in_background
+                )
+        t0 = self._clock()
+        try:
+            yield
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if self._defer_task is not None:
+                await asyncio.gather(self._defer_task, return_exceptions=True)
+            self._stats.observe(self.handler, name, self._clock() - t0)
+
+    def _settled(self) -> bool:
+        return self.deferred or self._defer_task is not None or self.interaction.response.is_done()
+
+    def _defer_in_background(self) -> None:
+        if not self._settled():
+            self._defer_task = asyncio.create_task(self._defer())
+
+    async def _maybe_defer(self, projected: float) -> None:
+        if self._settled():
+            return
+        if self.elapsed + projected < self.defer_at:
+            return
+        await self._defer()
+
+    async def _defer(self) -> None:
+        self._note_response()
+        try:
+            await self.interaction.response.defer(ephemeral=self.ephemeral, thinking=True)
+        except discord.HTTPException as e:
+            print(f"[ProfileBot] defer failed for {self.handler}: {e!r}")
+            return
+        self.deferred = True
+        self._stats.handler(self.handler).deferred += 1
+
+    def _note_response(self) -> None:
+        if not self._responded:
+            self._responded = True
+            if self.elapsed > INTERACTION_DEADLINE_SEC:
+                self._stats.handler(self.handler).late += 1
+
+    async def send(self, content: str | None = None, **kwargs: Any) -> None:
+        if content is not None:
+            kwargs["content"] = content
+        self._note_response()
+        if self.interaction.response.is_done():
+            await self.interaction.followup.send(ephemeral=self.ephemeral, **kwargs)
+        else:
+            await self.interaction.response.send_message(ephemeral=self.ephemeral, **kwargs)
+
+    async def send_modal(self, modal: discord.ui.Modal) -> None:
+        self._note_response()
+        await self.interaction.response.send_modal(modal)
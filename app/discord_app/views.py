@@ -3,7 +3,9 @@ from datetime import timedelta
 import discord
 
 from ..services import validators, render
+from ..models import ProfileData
 from ..storage.db import utcnow
+from .deadline import ResponseBudget
 
 RATE_LIMIT_MSG = "連続操作は制限されています。少し待ってから試してください。"
 LINK_ERR = "リンクは禁止です。URLや招待コードを削除して再入力してください。"
@@ -17,6 +19,12 @@ NOT_IN_VC = "VC参加中のみ投稿できます。先にそのVCへ参加して
 def _is_vc_chat_channel(ch: discord.abc.GuildChannel) -> bool:
     return isinstance(ch, (discord.VoiceChannel, discord.StageChannel))
 
+def _profile_fields(profile: ProfileData | None) -> dict[str, str]:
+    # Users who never saved have no row; show them the empty form instead of creating one.
+    if profile is None:
+        return {"name": "", "condition": "", "hobby": "", "care": "", "one": ""}
+    return {"name": profile.name, "condition": profile.condition, "hobby": profile.hobby, "care": profile.care, "one": profile.one}
+
 class ProfileEditModal(discord.ui.Modal):
     def __init__(self, bot: "CookieProfileBot", defaults: dict[str, str]):
         super().__init__(title="🍪Profile 編集", timeout=None)
@@ -67,8 +75,9 @@ class ProfileEditModal(discord.ui.Modal):
         gid = interaction.guild_id
         if gid is None:
             return
+        budget = ResponseBudget(interaction, "modal_save", self.bot.defer_stats)
         if not self.bot.limiter.allow(gid, interaction.user.id, "modal_save"):
-            await interaction.response.send_message(RATE_LIMIT_MSG, ephemeral=True)
+            await budget.send(RATE_LIMIT_MSG)
             return
 
         name = (self.name.value or "").strip()
@@ -78,34 +87,35 @@ class ProfileEditModal(discord.ui.Modal):
         one = (self.one.value or "").strip()
 
         if not name:
-            await interaction.response.send_message(NAME_REQ, ephemeral=True)
+            await budget.send(NAME_REQ)
             return
 
         for v in (name, condition, hobby, care, one):
             if validators.contains_link(v):
-                await interaction.response.send_message(LINK_ERR, ephemeral=True)
-                await self.bot.audit(interaction, action="edit_modal", result="ng", reason="invalid_input")
+                await budget.send(LINK_ERR)
+                self.bot.audit_later(interaction, action="edit_modal", result="ng", reason="invalid_input")
                 return
             if validators.contains_mention(v):
-                await interaction.response.send_message(MENTION_ERR, ephemeral=True)
-                await self.bot.audit(interaction, action="edit_modal", result="ng", reason="invalid_input")
+                await budget.send(MENTION_ERR)
+                self.bot.audit_later(interaction, action="edit_modal", result="ng", reason="invalid_input")
                 return
 
         bad_field = validators.first_violating_field_length(name, condition, hobby, care, one)
         if bad_field:
-            await interaction.response.send_message(LEN_ERR, ephemeral=True)
-            await self.bot.audit(interaction, action="edit_modal", result="ng", reason="invalid_input")
+            await budget.send(LEN_ERR)
+            self.bot.audit_later(interaction, action="edit_modal", result="ng", reason="invalid_input")
             return
 
-        # Ensure profile exists
-        _ = await self.bot.db.get_profile(gid, interaction.user.id)
-        await self.bot.db.update_profile_fields(gid, interaction.user.id, name=name, condition=condition, hobby=hobby, care=care, one=one)
+        # Ensure profile exists and save it in one commit
+        async with budget.step("save"), self.bot.db.transaction(name="modal_save") as tx:
+            await self.bot.db.ensure_profile(gid, interaction.user.id, tx=tx)
+            await self.bot.db.update_profile_fields(gid, interaction.user.id, name=name, condition=condition, hobby=hobby, care=care, one=one, tx=tx)
 
-        await interaction.response.send_message("保存しました。", ephemeral=True)
-        await self.bot.audit(interaction, action="edit_modal", result="ok", reason=None)
+        await budget.send("保存しました。")
+        self.bot.audit_later(interaction, action="edit_modal", result="ok", reason=None)
 
-        # Update (or recover) public profile message in configured channel
-        await self.bot.upsert_public_profile(interaction)
+        # Update (or recover) public profile message in configured channel, after the reply
+        self.bot.upsert_public_profile_later(interaction)
 
 class ProfilePanelView(discord.ui.View):
     """
@@ -121,56 +131,64 @@ class ProfilePanelView(discord.ui.View):
         gid = interaction.guild_id
         if gid is None:
             return
-        await self.bot.delete_if_old_panel(interaction)
-
-        profile = await self.bot.db.get_profile(gid, interaction.user.id)
-        defaults = {"name": profile.name, "condition": profile.condition, "hobby": profile.hobby, "care": profile.care, "one": profile.one}
-        await interaction.response.send_modal(ProfileEditModal(self.bot, defaults))
+        # The modal has to be the first response, so it can neither be deferred nor preceded
+        # by a notice; a stale panel is just cleaned up in the background.
+        budget = ResponseBudget(interaction, "panel_edit", self.bot.defer_stats, can_defer=False)
+        self.bot.check_stale_panel(interaction)
+        async with budget.step("load_profile"):
+            profile = await self.bot.db.peek_profile(gid, interaction.user.id)
+        defaults = _profile_fields(profile)
+        await budget.send_modal(ProfileEditModal(self.bot, defaults))
 
     @discord.ui.button(label="表示", style=discord.ButtonStyle.secondary, custom_id="panel:show", row=0)
     async def show(self, interaction: discord.Interaction, button: discord.ui.Button):
         gid = interaction.guild_id
         if gid is None:
             return
-        await self.bot.delete_if_old_panel(interaction)
+        budget = ResponseBudget(interaction, "panel_show", self.bot.defer_stats)
+        stale = self.bot.check_stale_panel(interaction)
 
-        profile = await self.bot.db.get_profile(gid, interaction.user.id)
+        async with budget.step("load_profile"):
+            profile = await self.bot.db.peek_profile(gid, interaction.user.id)
         emb = render.build_profile_embed(
             display_name=interaction.user.display_name,
             avatar_url=interaction.user.display_avatar.url if interaction.user.display_avatar else None,
-            name=profile.name,
-            condition=profile.condition,
-            hobby=profile.hobby,
-            care=profile.care,
-            one=profile.one,
+            **_profile_fields(profile),
         )
-        await interaction.response.send_message(embed=emb, ephemeral=True)
-        await self.bot.audit(interaction, action="panel_show", result="ok", reason=None)
+        await budget.send(embed=emb)
+        if stale:
+            self.bot.notify_stale_panel_later(interaction)
+        self.bot.audit_later(interaction, action="panel_show", result="ok", reason=None)
 
     @discord.ui.button(label="自動表示：ON", style=discord.ButtonStyle.secondary, custom_id="panel:autopost", row=0)
     async def toggle_autopost(self, interaction: discord.Interaction, button: discord.ui.Button):
         gid = interaction.guild_id
         if gid is None:
             return
-        await self.bot.delete_if_old_panel(interaction)
+        budget = ResponseBudget(interaction, "panel_toggle_autopost", self.bot.defer_stats)
+        stale = self.bot.check_stale_panel(interaction)
 
         if not self.bot.limiter.allow(gid, interaction.user.id, "vc_autopost_toggle"):
-            await interaction.response.send_message(RATE_LIMIT_MSG, ephemeral=True)
-            await self.bot.audit(interaction, action="vc_autopost_toggle", result="ng", reason="rate_limit")
+            await budget.send(RATE_LIMIT_MSG)
+            self.bot.audit_later(interaction, action="vc_autopost_toggle", result="ng", reason="rate_limit")
             return
 
-        profile = await self.bot.db.get_profile(gid, interaction.user.id)
-        enabled = not bool(profile.vc_autopost_enabled)
-        await self.bot.db.set_vc_autopost_enabled(gid, interaction.user.id, enabled)
+        async with budget.step("save"):
+            profile = await self.bot.db.get_or_create_profile(gid, interaction.user.id)
+            enabled = not bool(profile.vc_autopost_enabled)
+            await self.bot.db.set_vc_autopost_enabled(gid, interaction.user.id, enabled)
         button.label = "自動表示：ON" if enabled else "自動表示：OFF"
         try:
-            if interaction.message:
-                await interaction.message.edit(view=self)
+            if interaction.message and not stale:
+                async with budget.step("edit_panel"):
+                    await interaction.message.edit(view=self)
         except Exception:
             pass
 
-        await interaction.response.send_message(f"自動表示を{'ON' if enabled else 'OFF'}にしました。", ephemeral=True)
-        await self.bot.audit(interaction, action="vc_autopost_toggle", result="ok", reason=None)
+        await budget.send(f"自動表示を{'ON' if enabled else 'OFF'}にしました。")
+        if stale:
+            self.bot.notify_stale_panel_later(interaction)
+        self.bot.audit_later(interaction, action="vc_autopost_toggle", result="ok", reason=None)
 
 class PConfirmView(discord.ui.View):
     """
@@ -186,18 +204,14 @@ class PConfirmView(discord.ui.View):
         gid = interaction.guild_id
         if gid is None:
             return
-        profile = await self.bot.db.get_profile(gid, interaction.user.id)
+        profile = await self.bot.db.peek_profile(gid, interaction.user.id)
         emb = render.build_profile_embed(
             display_name=interaction.user.display_name,
             avatar_url=interaction.user.display_avatar.url if interaction.user.display_avatar else None,
-            name=profile.name,
-            condition=profile.condition,
-            hobby=profile.hobby,
-            care=profile.care,
-            one=profile.one,
+            **_profile_fields(profile),
         )
         await interaction.response.edit_message(content="プレビューです。", embed=emb, view=self)
-        await self.bot.audit(interaction, action="p_preview", result="ok", reason=None)
+        self.bot.audit_later(interaction, action="p_preview", result="ok", reason=None)
 
     @discord.ui.button(label="投稿する", style=discord.ButtonStyle.primary, row=0)
     async def post(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -207,49 +221,45 @@ class PConfirmView(discord.ui.View):
 
         if not self.bot.limiter.allow(gid, interaction.user.id, "p_post"):
             await interaction.response.send_message(RATE_LIMIT_MSG, ephemeral=True)
-            await self.bot.audit(interaction, action="p_post", result="ng", reason="rate_limit")
+            self.bot.audit_later(interaction, action="p_post", result="ng", reason="rate_limit")
             return
 
         ch = interaction.channel
         if ch is None or not _is_vc_chat_channel(ch):
             await interaction.response.send_message(NOT_VC_CHAT, ephemeral=True)
-            await self.bot.audit(interaction, action="p_post", result="ng", reason="not_vc_chat")
+            self.bot.audit_later(interaction, action="p_post", result="ng", reason="not_vc_chat")
             return
 
         # Must be in that VC
         if not getattr(interaction.user, "voice", None) or not interaction.user.voice or not interaction.user.voice.channel:
             await interaction.response.send_message(NOT_IN_VC, ephemeral=True)
-            await self.bot.audit(interaction, action="p_post", result="ng", reason="not_in_vc")
+            self.bot.audit_later(interaction, action="p_post", result="ng", reason="not_in_vc")
             return
         if interaction.user.voice.channel.id != ch.id:
             await interaction.response.send_message(NOT_IN_VC, ephemeral=True)
-            await self.bot.audit(interaction, action="p_post", result="ng", reason="not_in_vc")
+            self.bot.audit_later(interaction, action="p_post", result="ng", reason="not_in_vc")
             return
 
-        profile = await self.bot.db.get_profile(gid, interaction.user.id)
+        profile = await self.bot.db.peek_profile(gid, interaction.user.id)
         emb = render.build_profile_embed(
             display_name=interaction.user.display_name,
             avatar_url=interaction.user.display_avatar.url if interaction.user.display_avatar else None,
-            name=profile.name,
-            condition=profile.condition,
-            hobby=profile.hobby,
-            care=profile.care,
-            one=profile.one,
+            **_profile_fields(profile),
         )
         try:
             msg = await ch.send(content=f"🍪Profile <@{interaction.user.id}>", embed=emb, allowed_mentions=discord.AllowedMentions(users=[interaction.user]))
         except Exception:
             await interaction.response.send_message("このVC内チャットに投稿できません（権限不足）。", ephemeral=True)
-            await self.bot.audit(interaction, action="p_post", result="ng", reason="permission")
+            self.bot.audit_later(interaction, action="p_post", result="ng", reason="permission")
             return
 
         delete_at = utcnow() + timedelta(minutes=30)
-        await self.bot.db.schedule_delete(gid, ch.id, msg.id, delete_at)
+        await self.bot.delete_worker.schedule(gid, ch.id, msg.id, delete_at)
 
         await interaction.response.edit_message(content="投稿しました。（30分後に自動削除）", embed=None, view=None)
-        await self.bot.audit(interaction, action="p_post", result="ok", reason=None)
+        self.bot.audit_later(interaction, action="p_post", result="ok", reason=None)
 
     @discord.ui.button(label="やめる", style=discord.ButtonStyle.danger, row=0)
     async def cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
         await interaction.response.edit_message(content="キャンセルしました。", embed=None, view=None)
-        await self.bot.audit(interaction, action="p_cancel", result="ok", reason=None)
+        self.bot.audit_later(interaction, action="p_cancel", result="ok", reason=None)
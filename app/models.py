@@ -18,6 +18,7 @@ class ProfileData:
     updated_at: datetime
     public_message_id: int | None  # profile message in configured channel
     vc_autopost_enabled: int
+    public_content_hash: str | None = None  # render.profile_fingerprint of what public_message_id shows
 
 @dataclass
 class GuildConfigData:
@@ -1,6 +1,15 @@
 from __future__ import annotations
+import asyncio
+import gzip
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from dataclasses import asdict, dataclass
 from datetime import datetime
-from typing import Optional
+from typing import Awaitable, Callable, Optional, Protocol
 
 def fmt_ts(dt: datetime) -> str:
     return dt.strftime("%Y/%m/%d %H:%M")
@@ -19,3 +28,262 @@ def make_log_line(
     if reason:
         line += f" reason={reason}"
     return line
+
+@dataclass(frozen=True)
+class AuditEvent:
+    ts: datetime
+    guild_id: int
+    user_id: int
+    action: str
+    channel_id: Optional[int]
+    result: str
+    reason: Optional[str] = None
+
+    def to_line(self) -> str:
+        return make_log_line(**asdict(self))
+
+    def to_json(self) -> str:
+        d = asdict(self)
+        d["ts"] = self.ts.isoformat()
+        return json.dumps(d, ensure_ascii=False, separators=(",", ":"))
+
+class AuditSink(Protocol):
+    """emit() is called on the event loop and must not block or await."""
+    def emit(self, event: AuditEvent) -> None: ...
+    def start(self) -> None: ...
+    async def stop(self) -> None: ...
+
+class JsonlAuditSink:
+    """
+    Appends one JSON object per event to `path` from a background thread. When the file
+    reaches max_bytes it is rotated to path.1.gz (older ones shift up to path.<backups>.gz).
+    If the writer falls `max_queue` events behind, new events are dropped and counted.
+    """
+    def __init__(self, path: str, *, max_bytes: int = 50 * 1024 * 1024, backups: int = 5, max_queue: int = 100_000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue: queue.Queue[AuditEvent | None] = queue.Queue(maxsize=max_queue)
+        self._thread: threading.Thread | None = None
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+
+    def emit(self, event: AuditEvent) -> None:
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="cookie-audit", daemon=True)
+            self._thread.start()
+
+    async def stop(self) -> None:
+        """Write out everything queued so far, then stop the thread."""
+        thread, self._thread = self._thread, None
+        if thread is None or not thread.is_alive():
+            return
+        while True:
+            try:
+                self._queue.put_nowait(None)
+                break
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()  # make room for the sentinel: drop the oldest event
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+        await asyncio.to_thread(thread.join)
+
+    def _run(self) -> None:
+        f = None
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            f = open(self.path, "a", encoding="utf-8")
+            while True:
+                event = self._queue.get()
+                if event is None:
+                    return
+                lines = [event.to_json()]
+                stop = False
+                while len(lines) < 1000:  # write whatever else is already queued in one go
+                    try:
+                        nxt = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if nxt is None:
+                        stop = True
+                        break
+                    lines.append(nxt.to_json())
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                self.written += len(lines)
+                if f.tell() >= self.max_bytes:
+                    f.close()
+                    f = None
+                    self._rotate()
+                    f = open(self.path, "a", encoding="utf-8")
+                if stop:
+                    return
+        except Exception as e:
+            print(f"[ProfileBot] audit file writer stopped: {e!r}")
+        finally:
+            if f is not None:
+                f.close()
+
+    def _rotate(self) -> None:
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}.gz"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}.gz")
+        with open(self.path, "rb") as src, gzip.open(f"{self.path}.1.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(self.path)
+        self.rotations += 1
+
+DISCORD_MESSAGE_LIMIT = 2000
+_FENCE_OPEN = "```\n"
+_FENCE_CLOSE = "\n```"
+
+def pack_log_lines(lines: list[str], *, max_chars: int = DISCORD_MESSAGE_LIMIT) -> list[str]:
+    """Pack lines into as few ```code block``` messages of at most max_chars as possible."""
+    body_limit = max_chars - len(_FENCE_OPEN) - len(_FENCE_CLOSE)
+    chunks: list[str] = []
+    cur: list[str] = []
+    size = 0
+    for line in lines:
+        line = line[:body_limit]
+        extra = len(line) + (1 if cur else 0)
+        if cur and size + extra > body_limit:
+            chunks.append(_FENCE_OPEN + "\n".join(cur) + _FENCE_CLOSE)
+            cur, size, extra = [], 0, len(line)
+        cur.append(line)
+        size += extra
+    if cur:
+        chunks.append(_FENCE_OPEN + "\n".join(cur) + _FENCE_CLOSE)
+    return chunks
+
+class AuditBatcher:
+    """
+    Per-log-channel line buffer. add() never awaits: a channel's lines go out as one
+    code-block message once they approach the 2,000 character limit or `interval` seconds
+    after the first buffered line. Beyond `max_pending` buffered lines (all channels)
+    new lines are dropped and counted instead of applying back-pressure to the caller.
+    """
+    def __init__(
+        self,
+        send: Callable[[int, str], Awaitable[None]],
+        *,
+        interval: float = 2.0,
+        max_chars: int = DISCORD_MESSAGE_LIMIT,
+        max_pending: int = 2000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._send = send
+        self.interval = interval
+        self.max_chars = max_chars
+        self.max_pending = max_pending
+        self._clock = clock
+        self._body_limit = max_chars - len(_FENCE_OPEN) - len(_FENCE_CLOSE)
+        self._buffers: dict[int, list[str]] = {}
+        self._sizes: dict[int, int] = {}
+        self._since: dict[int, float] = {}
+        self._full: set[int] = set()
+        self._pending = 0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.added = 0
+        self.dropped = 0
+        self.messages_sent = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def add(self, channel_id: int, line: str) -> None:
+        if self._pending >= self.max_pending:
+            self.dropped += 1
+            return
+        buf = self._buffers.get(channel_id)
+        if buf is None:
+            buf = self._buffers[channel_id] = []
+            self._since[channel_id] = self._clock()
+            self._sizes[channel_id] = 0
+            self._wakeup.set()
+        buf.append(line)
+        self._sizes[channel_id] += len(line) + 1
+        self._pending += 1
+        self.added += 1
+        if self._sizes[channel_id] >= self._body_limit and channel_id not in self._full:
+            self._full.add(channel_id)
+            self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the timer loop and send whatever is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        await asyncio.gather(*(self._flush_channel(cid) for cid in list(self._buffers)))
+
+    async def _run(self) -> None:
+        while True:
+            if not self._buffers:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = self._clock()
+            ready = [cid for cid, since in self._since.items() if cid in self._full or since + self.interval <= now]
+            if not ready:
+                self._wakeup.clear()
+                due = min(self._since.values()) + self.interval
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), due - now)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await asyncio.gather(*(self._flush_channel(cid) for cid in ready))
+
+    async def _flush_channel(self, channel_id: int) -> None:
+        lines = self._buffers.pop(channel_id, None)
+        if not lines:
+            return
+        del self._sizes[channel_id], self._since[channel_id]
+        self._full.discard(channel_id)
+        self._pending -= len(lines)
+        for chunk in pack_log_lines(lines, max_chars=self.max_chars):
+            try:
+                await self._send(channel_id, chunk)
+                self.messages_sent += 1
+            except Exception as e:
+                print(f"[ProfileBot] audit flush to {channel_id} failed: {e!r}")
+
+class DiscordAuditSink:
+    """
+    Sends each event to its guild's log channel through an AuditBatcher. `log_channel_for`
+    must answer without I/O (e.g. from the guild config cache); guilds without a log
+    channel are skipped.
+    """
+    def __init__(self, batcher: AuditBatcher, log_channel_for: Callable[[int], Optional[int]]):
+        self.batcher = batcher
+        self._log_channel_for = log_channel_for
+
+    def emit(self, event: AuditEvent) -> None:
+        channel_id = self._log_channel_for(event.guild_id)
+        if channel_id:
+            self.batcher.add(channel_id, event.to_line())
+
+    def start(self) -> None:
+        self.batcher.start()
+
+    async def stop(self) -> None:
+        await self.batcher.stop()
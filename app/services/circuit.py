@@ -0,0 +1,91 @@
+from __future__ import annotations
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+@dataclass
+class _Circuit:
+    failures: int = 0
+    opened: int = 0            # how many times it has opened since the last success
+    open_until: float = 0.0
+    probe_until: float = 0.0   # a probe is in flight until then
+    last_reason: str = ""
+
+class CircuitBreaker(Generic[K]):
+    """
+    Per-target tracker for calls that keep failing the same way (NotFound / Forbidden).
+    After `threshold` consecutive failures the circuit opens and allow() returns False for
+    base_backoff seconds, doubling on every re-open up to max_backoff. Once the backoff has
+    passed one call at a time is let through as a probe; success forgets the target
+    entirely. Failures reported while the circuit is already open come from calls started
+    before it opened and are ignored, so a burst of them cannot inflate the backoff.
+    """
+    def __init__(
+        self,
+        *,
+        threshold: int = 3,
+        base_backoff: float = 60.0,
+        max_backoff: float = 6 * 3600.0,
+        max_entries: int = 10_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.threshold = threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_entries = max_entries
+        self._clock = clock
+        self._circuits: OrderedDict[K, _Circuit] = OrderedDict()
+        self.short_circuited = 0
+
+    def is_open(self, key: K) -> bool:
+        """Like `not allow(key)` but without taking the probe slot or counting."""
+        c = self._circuits.get(key)
+        if c is None or not c.opened:
+            return False
+        now = self._clock()
+        return c.open_until > now or c.probe_until > now
+
+    def allow(self, key: K) -> bool:
+        c = self._circuits.get(key)
+        if c is None or not c.opened:
+            return True
+        now = self._clock()
+        if c.open_until > now or c.probe_until > now:
+            self.short_circuited += 1
+            return False
+        # Backoff over: this caller is the probe. A probe that never reports back frees the
+        # slot after base_backoff.
+        c.probe_until = now + self.base_backoff
+        return True
+
+    def record_success(self, key: K) -> None:
+        self._circuits.pop(key, None)
+
+    def record_failure(self, key: K, reason: str = "") -> bool:
+        """Returns True only when this failure opens a closed circuit (report it once)."""
+        c = self._circuits.get(key)
+        if c is None:
+            c = self._circuits[key] = _Circuit()
+            while len(self._circuits) > self.max_entries:
+                self._circuits.popitem(last=False)
+        now = self._clock()
+        if c.opened and c.open_until > now:
+            return False  # already open: not new evidence
+        c.last_reason = reason
+        c.probe_until = 0.0
+        if not c.opened:
+            c.failures += 1
+            if c.failures < self.threshold:
+                return False
+        # Closed circuit reaching the threshold, or a failed probe: (re-)open with a longer backoff.
+        c.open_until = now + min(self.max_backoff, self.base_backoff * (2 ** c.opened))
+        c.opened += 1
+        return c.opened == 1
+
+    def open_circuits(self) -> dict[K, tuple[float, str]]:
+        """key -> (seconds until the next probe, last failure reason)"""
+        now = self._clock()
+        return {k: (c.open_until - now, c.last_reason) for k, c in self._circuits.items() if c.open_until > now}
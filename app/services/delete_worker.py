@@ -0,0 +1,104 @@
+from __future__ import annotations
+import asyncio
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable
+
+from ..storage.db import Database, utcnow
+
+# (channel_id, message_ids) -> None; must treat already-deleted / forbidden messages as done.
+DeleteMessages = Callable[[int, list[int]], Awaitable[None]]
+
+BULK_DELETE_MAX = 100  # Discord bulk-delete limit per request
+RETRY_AFTER = timedelta(seconds=60)
+
+class ScheduledDeleteWorker:
+    """
+    Drains scheduled_deletes. Keeps only the next due time in memory and sleeps until then;
+    schedule() from the same process wakes it early. The table is the source of truth, so a
+    restart simply reloads the next due time. Due rows are grouped per channel and handed to
+    delete_messages in chunks of up to 100 ids (one bulk-delete request each).
+    """
+    def __init__(self, db: Database, delete_messages: DeleteMessages, *, batch_limit: int = 500):
+        self.db = db
+        self._delete_messages = delete_messages
+        self.batch_limit = batch_limit
+        self._next_due: datetime | None = None
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.deleted = 0
+        self.failed_batches = 0
+
+    async def start(self) -> None:
+        self._next_due = await self.db.next_delete_at()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def schedule(self, guild_id: int, channel_id: int, message_id: int, delete_at: datetime) -> None:
+        await self.db.schedule_delete(guild_id, channel_id, message_id, delete_at)
+        if self._next_due is None or delete_at < self._next_due:
+            self._next_due = delete_at
+            self._wakeup.set()
+
+    async def metrics(self) -> dict[str, float]:
+        pending, overdue, oldest = await self.db.scheduled_delete_stats()
+        age = (utcnow() - oldest).total_seconds() if oldest else 0.0
+        return {
+            "pending": pending,
+            "backlog": overdue,
+            "oldest_overdue_sec": age,
+            "deleted": self.deleted,
+            "failed_batches": self.failed_batches,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            if self._next_due is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = (self._next_due - utcnow()).total_seconds()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            try:
+                drained_all = await self.drain_once()
+            except Exception as e:
+                print(f"[ProfileBot] scheduled delete failed: {e!r}")
+                self._next_due = utcnow() + RETRY_AFTER
+                continue
+            if drained_all:
+                self._next_due = await self.db.next_delete_at()
+
+    async def drain_once(self) -> bool:
+        """Delete one batch of due rows. Returns False if a channel failed and rows were kept for retry."""
+        rows = await self.db.due_deletes(limit=self.batch_limit)
+        by_channel: dict[tuple[int, int], list[int]] = {}
+        for guild_id, channel_id, message_id, _ in rows:
+            by_channel.setdefault((guild_id, channel_id), []).append(message_id)
+
+        ok = True
+        for (guild_id, channel_id), message_ids in by_channel.items():
+            for i in range(0, len(message_ids), BULK_DELETE_MAX):
+                chunk = message_ids[i:i + BULK_DELETE_MAX]
+                try:
+                    await self._delete_messages(channel_id, chunk)
+                except Exception as e:
+                    print(f"[ProfileBot] delete in channel {channel_id} failed: {e!r}")
+                    self.failed_batches += 1
+                    ok = False
+                    continue
+                await self.db.remove_scheduled_deletes([(guild_id, channel_id, mid) for mid in chunk])
+                self.deleted += len(chunk)
+        if not ok:
+            self._next_due = utcnow() + RETRY_AFTER
+        return ok
@@ -0,0 +1,87 @@
+from __future__ import annotations
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from .rate_limit import ExpiringMap
+
+# (display_name, avatar_url); None caches "could not be resolved" (user gone / deleted).
+Display = Optional[Tuple[str, Optional[str]]]
+
+class DisplayCache:
+    """
+    Bounded TTL + LRU cache of how a member is displayed, per (guild_id, user_id).
+    Negative entries (None) use a shorter TTL so departed users stop costing REST calls
+    without being hidden for long if they come back. Users a batched member query did not
+    return are remembered as non-members for negative_ttl, so their fallback skips fetch_member.
+    """
+    def __init__(
+        self,
+        *,
+        ttl: float = 900.0,
+        negative_ttl: float = 300.0,
+        max_entries: int = 50_000,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._d: OrderedDict[tuple[int, int], tuple[float, Display]] = OrderedDict()
+        self._not_members: ExpiringMap[tuple[int, int]] = ExpiringMap(negative_ttl, max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.rest_calls = 0
+        self.gateway_resolved = 0
+        self.not_member_skips = 0
+
+    def __len__(self) -> int:
+        return len(self._d)
+
+    def get(self, guild_id: int, user_id: int) -> tuple[bool, Display]:
+        key = (guild_id, user_id)
+        entry = self._d.get(key)
+        if entry is None or entry[0] <= self._clock():
+            if entry is not None:
+                del self._d[key]
+            self.misses += 1
+            return False, None
+        self._d.move_to_end(key)
+        self.hits += 1
+        return True, entry[1]
+
+    def __contains__(self, key: tuple[int, int]) -> bool:
+        entry = self._d.get(key)
+        return entry is not None and entry[0] > self._clock()
+
+    def put(self, guild_id: int, user_id: int, display: Display) -> None:
+        ttl = self.ttl if display is not None else self.negative_ttl
+        key = (guild_id, user_id)
+        self._d[key] = (self._clock() + ttl, display)
+        self._d.move_to_end(key)
+        while len(self._d) > self.max_entries:
+            self._d.popitem(last=False)
+
+    def invalidate(self, guild_id: int, user_id: int) -> None:
+        self._d.pop((guild_id, user_id), None)
+        self._not_members.discard((guild_id, user_id))
+
+    def mark_not_member(self, guild_id: int, user_id: int) -> None:
+        self._not_members.touch((guild_id, user_id), self._clock())
+
+    def is_not_member(self, guild_id: int, user_id: int) -> bool:
+        seen = self._not_members.get((guild_id, user_id))
+        return seen is not None and self._clock() - seen < self.negative_ttl
+
+    def stats(self) -> dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._d),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "rest_calls": self.rest_calls,
+            # every cache hit, member found by a batched gateway query and known non-member
+            # is a fetch_member avoided
+            "rest_calls_saved": self.hits + self.gateway_resolved + self.not_member_skips,
+        }
@@ -0,0 +1,84 @@
+from __future__ import annotations
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+Job = Callable[[], Awaitable[None]]
+
+class JobQueue:
+    """
+    Bounded queue for side effects that run after an interaction has been answered.
+    Jobs are sharded by guild onto `workers` FIFO lanes, so one guild's jobs run in the
+    order they were submitted while other guilds proceed in parallel. submit() never
+    awaits: a job arriving at a lane that already holds `max_pending` jobs is dropped
+    and counted.
+    """
+    def __init__(self, *, workers: int = 4, max_pending: int = 1000, clock: Callable[[], float] = time.monotonic):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._clock = clock
+        self._lanes: list[asyncio.Queue[tuple[str, Job, float]]] = [asyncio.Queue(maxsize=max_pending) for _ in range(workers)]
+        self._tasks: list[asyncio.Task] = []
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.high_water = 0
+        self.max_wait = 0.0
+
+    @property
+    def pending(self) -> int:
+        return sum(q.qsize() for q in self._lanes)
+
+    def submit(self, guild_id: int | None, name: str, job: Job) -> bool:
+        lane = self._lanes[(guild_id or 0) % self.workers]
+        try:
+            lane.put_nowait((name, job, self._clock()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            print(f"[ProfileBot] job queue full, dropped {name} for guild {guild_id}")
+            return False
+        self.submitted += 1
+        self.high_water = max(self.high_water, lane.qsize())
+        return True
+
+    def metrics(self) -> dict[str, float]:
+        return {
+            "pending": self.pending,
+            "high_water": self.high_water,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run(q)) for q in self._lanes]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Let queued jobs finish (up to `timeout` seconds), then stop the workers."""
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._lanes)), timeout)
+        except asyncio.TimeoutError:
+            print(f"[ProfileBot] job queue drain timed out with {self.pending} jobs left")
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, lane: asyncio.Queue[tuple[str, Job, float]]) -> None:
+        while True:
+            name, job, queued_at = await lane.get()
+            self.max_wait = max(self.max_wait, self._clock() - queued_at)
+            try:
+                await job()
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"[ProfileBot] job {name} failed: {e!r}")
+            finally:
+                lane.task_done()
@@ -1,38 +1,86 @@
 from __future__ import annotations
 import time
+from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Dict, Tuple
+from typing import Callable, Generic, Hashable, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
 
 @dataclass(frozen=True)
 class RateLimits:
     modal_save_sec: int = 60
     state_change_sec: int = 20
-    panel_bump_sec: int = 30  # bump at most once per 30s per guild
+    panel_bump_sec: int = 30  # debounced panel bump: at most 30s after a burst starts, at least 30s apart
     vc_autopost_toggle_sec: int = 30
 
 DEFAULT_LIMITS = RateLimits()
+DEFAULT_MAX_ENTRIES = 100_000
+
+class ExpiringMap(Generic[K]):
+    """
+    key -> last hit (monotonic seconds), kept in hit order.
+    Entries older than ttl are swept from the front on every touch, and the oldest entry is
+    dropped once max_entries is reached, so memory stays bounded however many keys pass through.
+    """
+    def __init__(self, ttl: float, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._d: OrderedDict[K, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._d)
+
+    def get(self, key: K) -> float | None:
+        return self._d.get(key)
+
+    def discard(self, key: K) -> None:
+        self._d.pop(key, None)
+
+    def touch(self, key: K, now: float) -> None:
+        self._d[key] = now
+        self._d.move_to_end(key)
+        self.sweep(now)
+        while len(self._d) > self.max_entries:
+            self._d.popitem(last=False)
+
+    def sweep(self, now: float) -> None:
+        d = self._d
+        while d:
+            oldest = next(iter(d.values()))
+            if now - oldest < self.ttl:
+                break
+            d.popitem(last=False)
 
 class RateLimiter:
-    def __init__(self, limits: RateLimits = DEFAULT_LIMITS):
+    def __init__(
+        self,
+        limits: RateLimits = DEFAULT_LIMITS,
+        *,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
         self.limits = limits
-        self._last: Dict[Tuple[int,int,str], float] = {}
-
-    def _window(self, action: str) -> int:
-        return {
+        self._clock = clock
+        self._windows = {
             "modal_save": self.limits.modal_save_sec,
             "state_change": self.limits.state_change_sec,
             "panel_bump": self.limits.panel_bump_sec,
             "vc_autopost_toggle": self.limits.vc_autopost_toggle_sec,
-        }.get(action, 0)
+        }
+        # A key older than the longest window can never block again.
+        self._last: ExpiringMap[Tuple[int, int, str]] = ExpiringMap(max(self._windows.values()), max_entries)
+
+    def _window(self, action: str) -> int:
+        return self._windows.get(action, 0)
 
     def allow(self, guild_id: int, user_id: int, action: str) -> bool:
         w = self._window(action)
         if w <= 0:
             return True
-        now = time.time()
+        now = self._clock()
         k = (guild_id, user_id, action)
         last = self._last.get(k)
         if last is None or (now - last) >= w:
-            self._last[k] = now
+            self._last.touch(k, now)
             return True
         return False
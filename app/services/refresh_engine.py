@@ -0,0 +1,122 @@
+from __future__ import annotations
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Iterable
+
+@dataclass(frozen=True)
+class RefreshBatch:
+    visited: int   # profiles looked at in this batch
+    edited: int    # messages actually PATCHed
+    wrapped: bool  # cursor reached the end of the guild and was reset to 0
+
+class RefreshEngine:
+    """
+    Background re-render of every public profile in every configured guild.
+    Guilds take turns one batch at a time (fair round-robin), all sharing one global
+    profiles/sec budget. A pass ends when every guild has wrapped its cursor once; progress
+    is checkpointed per guild by refresh_batch, so a restart resumes mid-pass.
+    """
+    def __init__(
+        self,
+        list_guilds: Callable[[], Iterable[int]],
+        refresh_batch: Callable[[int, int], Awaitable[RefreshBatch]],
+        *,
+        batch_size: int = 25,
+        profiles_per_sec: float = 4.0,
+        cycle_sec: float = 24 * 3600,
+        wait_ready: Callable[[], Awaitable[None]] | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._list_guilds = list_guilds
+        self._wait_ready = wait_ready
+        self._refresh_batch = refresh_batch
+        self.batch_size = batch_size
+        self.profiles_per_sec = profiles_per_sec
+        self.cycle_sec = cycle_sec
+        self._clock = clock
+        self._kick = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.passes = 0
+        self.last_pass_sec = 0.0
+        self.last_pass_profiles = 0
+        self.last_pass_edited = 0
+        self.current_pass_profiles = 0
+
+    @property
+    def last_pass_rate(self) -> float:
+        return self.last_pass_profiles / self.last_pass_sec if self.last_pass_sec > 0 else 0.0
+
+    def metrics(self) -> dict[str, float]:
+        return {
+            "passes": self.passes,
+            "last_pass_sec": self.last_pass_sec,
+            "last_pass_profiles": self.last_pass_profiles,
+            "last_pass_edited": self.last_pass_edited,
+            "last_pass_profiles_per_sec": self.last_pass_rate,
+            "current_pass_profiles": self.current_pass_profiles,
+        }
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def kick(self) -> None:
+        """Start the next pass now instead of waiting out the cycle interval."""
+        self._kick.set()
+
+    async def _run(self) -> None:
+        if self._wait_ready is not None:
+            await self._wait_ready()  # e.g. the gateway guild cache, which display resolution relies on
+        while True:
+            started = self._clock()
+            try:
+                await self.run_pass()
+            except Exception as e:
+                print(f"[ProfileBot] profile refresh pass failed: {e!r}")
+            wait = self.cycle_sec - (self._clock() - started)
+            self._kick.clear()
+            if wait > 0:
+                try:
+                    await asyncio.wait_for(self._kick.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_pass(self) -> None:
+        started = self._clock()
+        self.current_pass_profiles = 0
+        edited = 0
+        pending = list(dict.fromkeys(self._list_guilds()))
+        while pending:
+            still_pending = []
+            for gid in pending:
+                t0 = self._clock()
+                try:
+                    res = await self._refresh_batch(gid, self.batch_size)
+                except Exception as e:
+                    print(f"[ProfileBot] refresh batch for guild {gid} failed: {e!r}")
+                    continue  # drop the guild from this pass; its cursor is kept for the next one
+                self.current_pass_profiles += res.visited
+                edited += res.edited
+                if not res.wrapped:
+                    still_pending.append(gid)
+                # Global budget: this batch may not finish faster than visited / profiles_per_sec.
+                if self.profiles_per_sec > 0:
+                    spare = res.visited / self.profiles_per_sec - (self._clock() - t0)
+                    if spare > 0:
+                        await asyncio.sleep(spare)
+            pending = still_pending
+        self.passes += 1
+        self.last_pass_sec = self._clock() - started
+        self.last_pass_profiles = self.current_pass_profiles
+        self.last_pass_edited = edited
+        print(
+            f"[ProfileBot] profile refresh pass {self.passes}: {self.last_pass_profiles} profiles "
+            f"({self.last_pass_edited} edited) in {self.last_pass_sec:.1f}s, {self.last_pass_rate:.2f}/s"
+        )
@@ -1,7 +1,11 @@
 from __future__ import annotations
+import hashlib
+import json
 import discord
 
 EMBED_COLOR = 0xFFC0CB
+# Bump when build_profile_embed's layout changes so stored fingerprints stop matching.
+PROFILE_LAYOUT_VERSION = 1
 
 
 def safe(v: str) -> str:
@@ -45,3 +49,22 @@ def build_profile_embed(
     emb.add_field(name="自由に一言", value=safe(one), inline=False)
 
     return emb
+
+
+def profile_fingerprint(
+    *,
+    display_name: str,
+    avatar_url: str | None,
+    name: str,
+    condition: str,
+    hobby: str,
+    care: str,
+    one: str,
+) -> str:
+    """Stable hash of build_profile_embed's inputs; equal fingerprints mean an identical embed."""
+    payload = json.dumps(
+        [PROFILE_LAYOUT_VERSION, display_name, avatar_url, name, condition, hobby, care, one],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
@@ -0,0 +1,255 @@
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Awaitable, Callable, Generic, Hashable, Iterable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+class TimerHeap(Generic[K, V]):
+    """
+    Delayed callbacks driven by one coroutine instead of one sleeping Task each.
+    Entries sit in a min-heap keyed by fire time. Rescheduling or cancelling a key only marks
+    its old entry dead (lazy deletion); dead entries are skipped when they reach the top and the
+    heap is compacted if they pile up. Due entries run handler(key, value) in a short-lived task.
+    """
+    def __init__(self, handler: Callable[[K, V], Awaitable[None]], *, clock: Callable[[], float] = time.monotonic):
+        self._handler = handler
+        self._clock = clock
+        self._heap: list[list] = []  # [fire_at, seq, key, value, alive]
+        self._live: dict[K, list] = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._runner: asyncio.Task | None = None
+        self._running: set[asyncio.Task] = set()
+
+    @property
+    def depth(self) -> int:
+        """Pending (live) timers."""
+        return len(self._live)
+
+    @property
+    def heap_size(self) -> int:
+        """Heap entries including dead ones awaiting lazy removal."""
+        return len(self._heap)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._running)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._live
+
+    def schedule(self, key: K, delay: float, value: V) -> None:
+        old = self._live.pop(key, None)
+        if old is not None:
+            old[4] = False
+        entry = [self._clock() + delay, next(self._seq), key, value, True]
+        self._live[key] = entry
+        heapq.heappush(self._heap, entry)
+        self._maybe_compact()
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def cancel(self, key: K) -> bool:
+        entry = self._live.pop(key, None)
+        if entry is None:
+            return False
+        entry[4] = False
+        self._maybe_compact()
+        return True
+
+    def _maybe_compact(self) -> None:
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._live):
+            self._heap = [e for e in self._heap if e[4]]
+            heapq.heapify(self._heap)
+
+    def start(self) -> None:
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = list(self._running)
+        if self._runner is not None:
+            tasks.append(self._runner)
+            self._runner = None
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            heap = self._heap
+            while heap and not heap[0][4]:
+                heapq.heappop(heap)
+            if not heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = heap[0][0] - self._clock()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            entry = heapq.heappop(heap)
+            entry[4] = False
+            key, value = entry[2], entry[3]
+            if self._live.get(key) is entry:
+                del self._live[key]
+            task = asyncio.create_task(self._handler(key, value))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+class Debouncer(Generic[K]):
+    """
+    Trailing-edge debounce per key: action(key) runs once requests for the key have been quiet
+    for `quiet` seconds, but no later than `max_delay` after the first request of the burst,
+    and never sooner than `min_interval` after the key's previous fire.
+    At most one action per key runs at a time; requests arriving meanwhile fold into one rerun.
+    """
+    def __init__(
+        self,
+        action: Callable[[K], Awaitable[None]],
+        *,
+        quiet: float,
+        max_delay: float,
+        min_interval: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._action = action
+        self.quiet = quiet
+        self.max_delay = max_delay
+        self.min_interval = min_interval
+        self._clock = clock
+        self._timers: TimerHeap[K, None] = TimerHeap(self._fire, clock=clock)
+        self._burst_start: dict[K, float] = {}
+        self._last_fire: dict[K, float] = {}
+        self._running: set[K] = set()
+        self._rerun: set[K] = set()
+        self.requested = 0
+        self.fired = 0
+
+    @property
+    def pending(self) -> int:
+        return self._timers.depth
+
+    def start(self) -> None:
+        self._timers.start()
+
+    async def stop(self) -> None:
+        await self._timers.stop()
+
+    def request(self, key: K) -> None:
+        self.requested += 1
+        if key in self._running:
+            self._rerun.add(key)
+            return
+        now = self._clock()
+        first = self._burst_start.setdefault(key, now)
+        fire_at = min(now + self.quiet, first + self.max_delay)
+        last = self._last_fire.get(key)
+        if last is not None:
+            fire_at = max(fire_at, last + self.min_interval)
+        self._timers.schedule(key, max(0.0, fire_at - now), None)
+
+    async def _fire(self, key: K, _: None) -> None:
+        if key in self._running:
+            # A request landed between an earlier timer popping and its task starting; fold it in.
+            self._rerun.add(key)
+            return
+        self._burst_start.pop(key, None)
+        if self.min_interval:
+            self._last_fire[key] = self._clock()
+        self._running.add(key)
+        try:
+            self.fired += 1
+            await self._action(key)
+        finally:
+            self._running.discard(key)
+            if key in self._rerun:
+                self._rerun.discard(key)
+                self.request(key)
+
+class CoalescingWorker(Generic[K]):
+    """
+    Dirty-set worker: mark() adds a key to an in-memory set; once marks have stopped for
+    `settle` seconds (or `max_delay` after the first one) the whole set is swapped out and
+    handler(key) runs once per key, at most `concurrency` at a time. Repeated marks of the
+    same key before it is handled cost nothing.
+    """
+    def __init__(
+        self,
+        handler: Callable[[K], Awaitable[None]],
+        *,
+        settle: float,
+        max_delay: float,
+        concurrency: int = 4,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self._handler = handler
+        self.settle = settle
+        self.max_delay = max_delay
+        self.concurrency = concurrency
+        self._clock = clock
+        self._dirty: set[K] = set()
+        self._first_mark = 0.0
+        self._last_mark = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self.marked = 0
+        self.handled = 0
+
+    @property
+    def pending(self) -> int:
+        return len(self._dirty)
+
+    def mark(self, key: K) -> None:
+        self.marked += 1
+        now = self._clock()
+        if not self._dirty:
+            self._first_mark = now
+        self._last_mark = now
+        self._dirty.add(key)
+        self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            if not self._dirty:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            now = self._clock()
+            due = min(self._last_mark + self.settle, self._first_mark + self.max_delay)
+            if due > now:
+                await asyncio.sleep(due - now)
+                continue
+            batch, self._dirty = self._dirty, set()
+            await self.drain(batch)
+
+    async def drain(self, batch: Iterable[K]) -> None:
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def _one(key: K) -> None:
+            async with sem:
+                try:
+                    await self._handler(key)
+                except Exception as e:
+                    print(f"[ProfileBot] dirty-set handler failed for {key!r}: {e!r}")
+                self.handled += 1
+
+        await asyncio.gather(*(_one(k) for k in batch))
@@ -1,21 +1,35 @@
 from __future__ import annotations
 import time
-from typing import Dict, Tuple
+from typing import Callable, Generic, Hashable, Tuple, TypeVar
 
 from ..models import ProfileData
+from .rate_limit import DEFAULT_MAX_ENTRIES, ExpiringMap
+
+K = TypeVar("K", bound=Hashable)
+T = TypeVar("T")
+
+MAX_EMBEDS_PER_MESSAGE = 10  # Discord per-message embed limit
 
 def should_autopost(profile: ProfileData) -> bool:
     return bool(profile.vc_autopost_enabled)
 
 class VCAutoPostLimiter:
-    def __init__(self, *, global_cooldown_sec: int = 300, vc_cooldown_sec: int = 600):
+    def __init__(
+        self,
+        *,
+        global_cooldown_sec: int = 300,
+        vc_cooldown_sec: int = 600,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
         self.global_cooldown_sec = global_cooldown_sec
         self.vc_cooldown_sec = vc_cooldown_sec
-        self._last_global: Dict[Tuple[int, int], float] = {}
-        self._last_vc: Dict[Tuple[int, int, int], float] = {}
+        self._clock = clock
+        self._last_global: ExpiringMap[Tuple[int, int]] = ExpiringMap(global_cooldown_sec, max_entries)
+        self._last_vc: ExpiringMap[Tuple[int, int, int]] = ExpiringMap(vc_cooldown_sec, max_entries)
 
     def allow(self, guild_id: int, user_id: int, vc_id: int) -> bool:
-        now = time.time()
+        now = self._clock()
         gk = (guild_id, user_id)
         vk = (guild_id, user_id, vc_id)
         last_global = self._last_global.get(gk)
@@ -24,6 +38,30 @@ class VCAutoPostLimiter:
         last_vc = self._last_vc.get(vk)
         if last_vc is not None and (now - last_vc) < self.vc_cooldown_sec:
             return False
-        self._last_global[gk] = now
-        self._last_vc[vk] = now
+        self._last_global.touch(gk, now)
+        self._last_vc.touch(vk, now)
         return True
+
+
+class AutoPostBatcher(Generic[K, T]):
+    """
+    Collects due autoposts per voice channel so they go out as one message.
+    add() hands back a full batch as soon as max_items is reached; otherwise the caller
+    flushes with take() when its aggregation window ends.
+    """
+    def __init__(self, max_items: int = MAX_EMBEDS_PER_MESSAGE):
+        self.max_items = max_items
+        self._pending: dict[K, list[T]] = {}
+
+    def add(self, key: K, item: T) -> list[T] | None:
+        batch = self._pending.setdefault(key, [])
+        batch.append(item)
+        if len(batch) >= self.max_items:
+            return self.take(key)
+        return None
+
+    def take(self, key: K) -> list[T]:
+        return self._pending.pop(key, [])
+
+    def pending(self, key: K) -> int:
+        return len(self._pending.get(key, ()))
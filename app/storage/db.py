@@ -1,8 +1,13 @@
 from __future__ import annotations
 import asyncio
+import contextlib
 import sqlite3
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
-from typing import Optional
+from pathlib import Path
+from typing import AsyncIterator, Callable, Optional, TypeVar
 from ..models import ProfileData, GuildConfigData
 
 def utcnow() -> datetime:
@@ -14,25 +19,250 @@ def dt_to_str(dt: datetime) -> str:
 def str_to_dt(s: str) -> datetime:
     return datetime.fromisoformat(s)
 
+BUSY_TIMEOUT_MS = 5000
+STATEMENT_CACHE_SIZE = 256
+
+T = TypeVar("T")
+
+class QueryStats:
+    """Per-query-name latency samples (bounded), for count/p50/p99 dumps."""
+    def __init__(self, max_samples: int = 1024):
+        self.max_samples = max_samples
+        self._counts: dict[str, int] = {}
+        self._samples: dict[str, deque[float]] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        self._counts[name] = self._counts.get(name, 0) + 1
+        samples = self._samples.get(name)
+        if samples is None:
+            samples = self._samples[name] = deque(maxlen=self.max_samples)
+        samples.append(seconds)
+
+    @staticmethod
+    def _percentile(ordered: list[float], q: float) -> float:
+        idx = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+        return ordered[idx]
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        out: dict[str, dict[str, float]] = {}
+        for name, samples in self._samples.items():
+            ordered = sorted(samples)
+            out[name] = {
+                "count": self._counts[name],
+                "p50_ms": self._percentile(ordered, 0.50) * 1000,
+                "p99_ms": self._percentile(ordered, 0.99) * 1000,
+            }
+        return out
+
+    def format(self) -> str:
+        lines = []
+        for name, st in sorted(self.snapshot().items()):
+            lines.append(f"{name}: count={st['count']} p50={st['p50_ms']:.2f}ms p99={st['p99_ms']:.2f}ms")
+        return "\n".join(lines)
+
+class Transaction:
+    """Work buffered by Database.transaction(); see there."""
+    def __init__(self) -> None:
+        self.ops: list[Callable[[sqlite3.Connection], None]] = []
+        self.commit_hooks: list[Callable[[], None]] = []
+
+    def execute(self, sql: str, params: tuple = ()) -> None:
+        self.ops.append(lambda conn: conn.execute(sql, params).close())
+
+    def call(self, fn: Callable[[sqlite3.Connection], None]) -> None:
+        self.ops.append(fn)
+
+    def on_commit(self, fn: Callable[[], None]) -> None:
+        self.commit_hooks.append(fn)
+
+def _migration_1_baseline(conn: sqlite3.Connection) -> None:
+    """
+    The schema as it stood before versioning. Written to be idempotent, so it also upgrades
+    databases from any earlier unversioned deployment.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS guild_config(
+        guild_id INTEGER PRIMARY KEY,
+        channel_id INTEGER,
+        log_channel_id INTEGER,
+        panel_message_id INTEGER
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS profiles(
+        guild_id INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        name TEXT NOT NULL DEFAULT '',
+        condition TEXT NOT NULL DEFAULT '',
+        hobby TEXT NOT NULL DEFAULT '',
+        care TEXT NOT NULL DEFAULT '',
+        one TEXT NOT NULL DEFAULT '',
+        state TEXT NOT NULL DEFAULT '通常',
+        state_updated_at TEXT NOT NULL,
+        updated_at TEXT NOT NULL,
+        public_message_id INTEGER,
+        vc_autopost_enabled INTEGER NOT NULL DEFAULT 1,
+        public_content_hash TEXT,
+        PRIMARY KEY (guild_id, user_id)
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS scheduled_deletes(
+        guild_id INTEGER NOT NULL,
+        channel_id INTEGER NOT NULL,
+        message_id INTEGER NOT NULL,
+        delete_at TEXT NOT NULL,
+        PRIMARY KEY (guild_id, channel_id, message_id)
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS profile_refresh_progress(
+        guild_id INTEGER PRIMARY KEY,
+        last_public_message_id INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS command_sync_state(
+        scope TEXT PRIMARY KEY,
+        tree_hash TEXT NOT NULL,
+        synced_at TEXT NOT NULL
+    )
+    """)
+
+    def _colnames(table: str) -> set[str]:
+        return {r["name"] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+
+    # ---- schema migration (backward compatible) ----
+    # Older deployments may have different column names. We add missing columns in-place.
+    colnames = _colnames("guild_config")
+
+    if "channel_id" not in colnames:
+        conn.execute("ALTER TABLE guild_config ADD COLUMN channel_id INTEGER")
+        # If legacy column exists, backfill.
+        if "panel_channel_id" in colnames:
+            conn.execute("UPDATE guild_config SET channel_id = panel_channel_id WHERE channel_id IS NULL AND panel_channel_id IS NOT NULL")
+
+    # Ensure other expected columns exist
+    if "log_channel_id" not in colnames:
+        conn.execute("ALTER TABLE guild_config ADD COLUMN log_channel_id INTEGER")
+    if "panel_message_id" not in colnames:
+        conn.execute("ALTER TABLE guild_config ADD COLUMN panel_message_id INTEGER")
+
+    pnames = _colnames("profiles")
+    if "public_message_id" not in pnames:
+        conn.execute("ALTER TABLE profiles ADD COLUMN public_message_id INTEGER")
+    if "vc_autopost_enabled" not in pnames:
+        conn.execute("ALTER TABLE profiles ADD COLUMN vc_autopost_enabled INTEGER NOT NULL DEFAULT 1")
+    if "public_content_hash" not in pnames:
+        conn.execute("ALTER TABLE profiles ADD COLUMN public_content_hash TEXT")
+
+    # Normalize legacy state labels to current ones.
+    conn.execute("UPDATE profiles SET state='元気' WHERE state='好調'")
+    conn.execute("UPDATE profiles SET state='低速' WHERE state='省エネ'")
+    conn.execute("UPDATE profiles SET state='しんどい' WHERE state='休憩'")
+
+def _migration_2_scan_indexes(conn: sqlite3.Connection) -> None:
+    """Indexes for the refresh cursor walk and the scheduled-delete queue."""
+    # list_public_profiles_for_refresh: guild_id=? AND public_message_id > ? ORDER BY public_message_id
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_profiles_guild_public_message
+    ON profiles(guild_id, public_message_id) WHERE public_message_id IS NOT NULL
+    """)
+    # due_deletes / next_delete_at: delete_at <= ? ORDER BY delete_at, MIN(delete_at)
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_scheduled_deletes_delete_at
+    ON scheduled_deletes(delete_at)
+    """)
+
+# Append only: entry N is applied once to databases whose user_version is below N.
+MIGRATIONS: list[Callable[[sqlite3.Connection], None]] = [
+    _migration_1_baseline,
+    _migration_2_scan_indexes,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
 class Database:
-    def __init__(self, path: str):
+    """
+    SQLite access. By default one connection serializes every statement behind one lock.
+    With wal=True the file is WAL-journaled: writes keep that single connection, while reads
+    go through a bounded pool of read-only connections and run concurrently with writes.
+
+    The write connection lives on a dedicated single DB thread (not the shared default executor);
+    pooled readers get their own small executor.
+    """
+    def __init__(self, path: str, *, wal: bool = False, read_pool_size: int = 4):
         self.path = path
+        self.wal = wal
+        self.read_pool_size = read_pool_size
         self._conn: Optional[sqlite3.Connection] = None
         self._lock = asyncio.Lock()
+        self._readers: Optional[asyncio.Queue[sqlite3.Connection]] = None
+        self._reader_conns: list[sqlite3.Connection] = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._read_executor: Optional[ThreadPoolExecutor] = None
+        self.query_stats = QueryStats()
+        # guild_config is tiny and read on every message; keep it in memory (write-through).
+        self._guild_cfg: dict[int, GuildConfigData] = {}
+        self._guild_cfg_hits = 0
+        self._guild_cfg_misses = 0
+        # profile channel id -> guild id, so on_message can drop other channels without awaiting.
+        self._profile_channels: dict[int, int] = {}
+        # phase -> seconds for the last connect()
+        self.connect_timings: dict[str, float] = {}
 
     async def connect(self) -> None:
         def _open() -> sqlite3.Connection:
-            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
             conn.row_factory = sqlite3.Row
+            if self.wal:
+                conn.execute("PRAGMA journal_mode=WAL")
+                # NORMAL is durable across application crashes in WAL mode; only power loss can drop the last commits.
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
             return conn
-        self._conn = await asyncio.to_thread(_open)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cookie-db")
+        t0 = time.perf_counter()
+        self._conn = await self._submit(self._executor, _open, "connect")
+        t1 = time.perf_counter()
         await self._migrate()
+        t2 = time.perf_counter()
+        if self.wal and self.read_pool_size > 0:
+            self._read_executor = ThreadPoolExecutor(max_workers=self.read_pool_size, thread_name_prefix="cookie-db-read")
+            self._reader_conns = await self._submit(
+                self._executor,
+                lambda: [self._open_reader() for _ in range(self.read_pool_size)],
+                "connect",
+            )
+            self._readers = asyncio.Queue()
+            for rc in self._reader_conns:
+                self._readers.put_nowait(rc)
+        await self._load_guild_configs()
+        self.connect_timings = {"open": t1 - t0, "migrate": t2 - t1, "load": time.perf_counter() - t2}
+
+    def _open_reader(self) -> sqlite3.Connection:
+        uri = Path(self.path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        return conn
 
     async def close(self) -> None:
+        if self._reader_conns:
+            readers = self._reader_conns
+            self._reader_conns = []
+            self._readers = None
+            await self._submit(self._executor, lambda: [rc.close() for rc in readers], "close")
         if self._conn:
             conn = self._conn
             self._conn = None
-            await asyncio.to_thread(conn.close)
+            self._guild_cfg.clear()
+            self._profile_channels = {}
+            await self._submit(self._executor, conn.close, "close")
+        for ex in (self._read_executor, self._executor):
+            if ex is not None:
+                ex.shutdown(wait=True)
+        self._executor = None
+        self._read_executor = None
 
     @property
     def conn(self) -> sqlite3.Connection:
@@ -40,111 +270,103 @@ class Database:
             raise RuntimeError("DB not connected")
         return self._conn
 
-    async def _exec(self, sql: str, params: tuple = ()) -> None:
-        async with self._lock:
-            def _run():
-                cur = self.conn.execute(sql, params)
-                self.conn.commit()
-                cur.close()
-            await asyncio.to_thread(_run)
+    async def _submit(self, executor: Optional[ThreadPoolExecutor], fn: Callable[[], T], name: str) -> T:
+        if executor is None:
+            raise RuntimeError("DB not connected")
+        t0 = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, fn)
+        finally:
+            self.query_stats.record(name, time.perf_counter() - t0)
 
-    async def _fetchone(self, sql: str, params: tuple = ()) -> sqlite3.Row | None:
+    def format_query_stats(self) -> str:
+        return self.query_stats.format()
+
+    async def _exec(self, sql: str, params: tuple = (), *, name: str = "adhoc") -> None:
+        def _run():
+            cur = self.conn.execute(sql, params)
+            self.conn.commit()
+            cur.close()
         async with self._lock:
-            def _run():
-                cur = self.conn.execute(sql, params)
-                row = cur.fetchone()
-                cur.close()
-                return row
-            return await asyncio.to_thread(_run)
-
-    async def _fetchall(self, sql: str, params: tuple = ()) -> list[sqlite3.Row]:
+            await self._submit(self._executor, _run, name)
+
+    async def _read(self, fn: Callable[[sqlite3.Connection], T], name: str) -> T:
+        if self._readers is None:
+            async with self._lock:
+                return await self._submit(self._executor, lambda: fn(self.conn), name)
+        conn = await self._readers.get()
+        try:
+            return await self._submit(self._read_executor, lambda: fn(conn), name)
+        finally:
+            self._readers.put_nowait(conn)
+
+    async def _fetchone(self, sql: str, params: tuple = (), *, name: str = "adhoc") -> sqlite3.Row | None:
+        def _run(conn: sqlite3.Connection):
+            cur = conn.execute(sql, params)
+            row = cur.fetchone()
+            cur.close()
+            return row
+        return await self._read(_run, name)
+
+    async def _fetchall(self, sql: str, params: tuple = (), *, name: str = "adhoc") -> list[sqlite3.Row]:
+        def _run(conn: sqlite3.Connection):
+            cur = conn.execute(sql, params)
+            rows = cur.fetchall()
+            cur.close()
+            return rows
+        return await self._read(_run, name)
+
+    @contextlib.asynccontextmanager
+    async def transaction(self, *, name: str = "transaction") -> AsyncIterator[Transaction]:
+        """
+        Unit of work: statements added to the yielded Transaction are applied on exit
+        in one lock hold, one DB-thread hop and one commit (rolled back as a whole on error).
+        Do not await reads on this Database inside the block; nothing is written until exit.
+        """
+        tx = Transaction()
+        yield tx
+        if not tx.ops:
+            return
+
+        def _run() -> None:
+            conn = self.conn
+            conn.execute("BEGIN")
+            try:
+                for op in tx.ops:
+                    op(conn)
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.commit()
         async with self._lock:
-            def _run():
-                cur = self.conn.execute(sql, params)
-                rows = cur.fetchall()
-                cur.close()
-                return rows
-            return await asyncio.to_thread(_run)
+            await self._submit(self._executor, _run, name)
+        for cb in tx.commit_hooks:
+            cb()
+
+    async def _write(self, sql: str, params: tuple, *, name: str, tx: Transaction | None) -> None:
+        if tx is None:
+            await self._exec(sql, params, name=name)
+        else:
+            tx.execute(sql, params)
+
+    @staticmethod
+    def _after_write(tx: Transaction | None, fn: Callable[[], None]) -> None:
+        if tx is None:
+            fn()
+        else:
+            tx.on_commit(fn)
 
     async def _migrate(self) -> None:
-        await self._exec("""
-        CREATE TABLE IF NOT EXISTS guild_config(
-            guild_id INTEGER PRIMARY KEY,
-            channel_id INTEGER,
-            log_channel_id INTEGER,
-            panel_message_id INTEGER
-        )
-        """)
-        await self._exec("""
-        CREATE TABLE IF NOT EXISTS profiles(
-            guild_id INTEGER NOT NULL,
-            user_id INTEGER NOT NULL,
-            name TEXT NOT NULL DEFAULT '',
-            condition TEXT NOT NULL DEFAULT '',
-            hobby TEXT NOT NULL DEFAULT '',
-            care TEXT NOT NULL DEFAULT '',
-            one TEXT NOT NULL DEFAULT '',
-            state TEXT NOT NULL DEFAULT '通常',
-            state_updated_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL,
-            public_message_id INTEGER,
-            vc_autopost_enabled INTEGER NOT NULL DEFAULT 1,
-            PRIMARY KEY (guild_id, user_id)
-        )
-        """)
-        await self._exec("""
-        CREATE TABLE IF NOT EXISTS scheduled_deletes(
-            guild_id INTEGER NOT NULL,
-            channel_id INTEGER NOT NULL,
-            message_id INTEGER NOT NULL,
-            delete_at TEXT NOT NULL,
-            PRIMARY KEY (guild_id, channel_id, message_id)
-        )
-        """)
-        await self._exec("""
-        CREATE TABLE IF NOT EXISTS profile_refresh_progress(
-            guild_id INTEGER PRIMARY KEY,
-            last_public_message_id INTEGER NOT NULL DEFAULT 0
-        )
-        """)
-
-        # ---- schema migration (backward compatible) ----
-        # Older deployments may have different column names. We add missing columns in-place.
-        cols = await self._fetchall("PRAGMA table_info(guild_config)")
-        colnames = {r["name"] for r in cols}
-
-        if "channel_id" not in colnames:
-            await self._exec("ALTER TABLE guild_config ADD COLUMN channel_id INTEGER")
-            # If legacy column exists, backfill.
-            legacy_cols = {r["name"] for r in await self._fetchall("PRAGMA table_info(guild_config)")}
-            if "panel_channel_id" in legacy_cols:
-                await self._exec("UPDATE guild_config SET channel_id = panel_channel_id WHERE channel_id IS NULL AND panel_channel_id IS NOT NULL")
-
-        # Ensure other expected columns exist
-        cols2 = await self._fetchall("PRAGMA table_info(guild_config)")
-        colnames2 = {r["name"] for r in cols2}
-        if "log_channel_id" not in colnames2:
-            await self._exec("ALTER TABLE guild_config ADD COLUMN log_channel_id INTEGER")
-        if "panel_message_id" not in colnames2:
-            await self._exec("ALTER TABLE guild_config ADD COLUMN panel_message_id INTEGER")
-
-        pcols = await self._fetchall("PRAGMA table_info(profiles)")
-        pnames = {r["name"] for r in pcols}
-        if "public_message_id" not in pnames:
-            await self._exec("ALTER TABLE profiles ADD COLUMN public_message_id INTEGER")
-        if "vc_autopost_enabled" not in pnames:
-            await self._exec("ALTER TABLE profiles ADD COLUMN vc_autopost_enabled INTEGER NOT NULL DEFAULT 1")
-
-        # Normalize legacy state labels to current ones.
-        await self._exec("UPDATE profiles SET state='元気' WHERE state='好調'")
-        await self._exec("UPDATE profiles SET state='低速' WHERE state='省エネ'")
-        await self._exec("UPDATE profiles SET state='しんどい' WHERE state='休憩'")
+        """Apply the migrations newer than PRAGMA user_version, each once, in its own transaction."""
+        version = await self._submit(self._executor, lambda: self.conn.execute("PRAGMA user_version").fetchone()[0], "migrate")
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            async with self.transaction(name="migrate") as tx:
+                tx.call(migration)
+                tx.execute(f"PRAGMA user_version={number}")
 
     # config
-    async def get_guild_config(self, guild_id: int) -> GuildConfigData:
-        row = await self._fetchone("SELECT * FROM guild_config WHERE guild_id=?", (guild_id,))
-        if not row:
-            return GuildConfigData(guild_id, None, None, None)
+    @staticmethod
+    def _row_to_guild_config(row: sqlite3.Row) -> GuildConfigData:
         return GuildConfigData(
             guild_id=row["guild_id"],
             channel_id=row["channel_id"],
@@ -152,32 +374,104 @@ class Database:
             panel_message_id=row["panel_message_id"],
         )
 
-    async def set_guild_config(self, guild_id: int, *, channel_id: int, log_channel_id: int | None) -> None:
-        await self._exec("""
+    async def _load_guild_configs(self) -> None:
+        rows = await self._fetchall("SELECT * FROM guild_config", name="load_guild_configs")
+        self._guild_cfg = {row["guild_id"]: self._row_to_guild_config(row) for row in rows}
+        self._rebuild_profile_channel_index()
+
+    def _rebuild_profile_channel_index(self) -> None:
+        self._profile_channels = {
+            cfg.channel_id: gid for gid, cfg in self._guild_cfg.items() if cfg.channel_id
+        }
+
+    def guild_for_profile_channel(self, channel_id: int) -> int | None:
+        return self._profile_channels.get(channel_id)
+
+    def configured_guild_ids(self) -> list[int]:
+        return list(self._profile_channels.values())
+
+    def has_profile_channel(self, guild_id: int) -> bool:
+        cfg = self._guild_cfg.get(guild_id)
+        return bool(cfg and cfg.channel_id)
+
+    def log_channel_for(self, guild_id: int) -> int | None:
+        """The guild's audit log channel (cache only, no I/O)."""
+        cfg = self._guild_cfg.get(guild_id)
+        return cfg.log_channel_id if cfg else None
+
+    def is_stale_panel(self, guild_id: int, message_id: int) -> bool:
+        """True when message_id is a panel that has since been replaced (cache only, no I/O)."""
+        cfg = self._guild_cfg.get(guild_id)
+        return bool(cfg and cfg.panel_message_id and message_id != cfg.panel_message_id)
+
+    async def get_guild_config(self, guild_id: int) -> GuildConfigData:
+        cached = self._guild_cfg.get(guild_id)
+        if cached is not None:
+            self._guild_cfg_hits += 1
+            return cached
+        self._guild_cfg_misses += 1
+        row = await self._fetchone("SELECT * FROM guild_config WHERE guild_id=?", (guild_id,), name="get_guild_config")
+        if not row:
+            cfg = GuildConfigData(guild_id, None, None, None)
+        else:
+            cfg = self._row_to_guild_config(row)
+        # A set_guild_config that committed while the read was in flight already cached newer data.
+        return self._guild_cfg.setdefault(guild_id, cfg)
+
+    def guild_config_cache_stats(self) -> dict[str, int]:
+        return {
+            "size": len(self._guild_cfg),
+            "hits": self._guild_cfg_hits,
+            "misses": self._guild_cfg_misses,
+        }
+
+    async def set_guild_config(
+        self,
+        guild_id: int,
+        *,
+        channel_id: int,
+        log_channel_id: int | None,
+        tx: Transaction | None = None,
+    ) -> None:
+        await self._write("""
         INSERT INTO guild_config(guild_id, channel_id, log_channel_id, panel_message_id)
         VALUES(?,?,?,NULL)
         ON CONFLICT(guild_id) DO UPDATE SET
             channel_id=excluded.channel_id,
             log_channel_id=excluded.log_channel_id
-        """, (guild_id, channel_id, log_channel_id))
+        """, (guild_id, channel_id, log_channel_id), name="set_guild_config", tx=tx)
 
-    async def set_panel_message_id(self, guild_id: int, message_id: int | None) -> None:
-        await self._exec("""
+        # Cached objects are replaced, never mutated, so callers holding an old config keep a stable snapshot.
+        def _update_cache() -> None:
+            old = self._guild_cfg.get(guild_id)
+            self._guild_cfg[guild_id] = GuildConfigData(
+                guild_id=guild_id,
+                channel_id=channel_id,
+                log_channel_id=log_channel_id,
+                panel_message_id=old.panel_message_id if old else None,
+            )
+            self._rebuild_profile_channel_index()
+        self._after_write(tx, _update_cache)
+
+    async def set_panel_message_id(self, guild_id: int, message_id: int | None, *, tx: Transaction | None = None) -> None:
+        await self._write("""
         INSERT INTO guild_config(guild_id, panel_message_id) VALUES(?,?)
         ON CONFLICT(guild_id) DO UPDATE SET panel_message_id=excluded.panel_message_id
-        """, (guild_id, message_id))
+        """, (guild_id, message_id), name="set_panel_message_id", tx=tx)
+
+        def _update_cache() -> None:
+            old = self._guild_cfg.get(guild_id)
+            self._guild_cfg[guild_id] = GuildConfigData(
+                guild_id=guild_id,
+                channel_id=old.channel_id if old else None,
+                log_channel_id=old.log_channel_id if old else None,
+                panel_message_id=message_id,
+            )
+        self._after_write(tx, _update_cache)
 
     # profiles
-    async def get_profile(self, guild_id: int, user_id: int) -> ProfileData:
-        row = await self._fetchone("SELECT * FROM profiles WHERE guild_id=? AND user_id=?", (guild_id, user_id))
-        if not row:
-            now = utcnow()
-            await self._exec("""
-            INSERT INTO profiles(guild_id, user_id, state_updated_at, updated_at)
-            VALUES(?,?,?,?)
-            """, (guild_id, user_id, dt_to_str(now), dt_to_str(now)))
-            row = await self._fetchone("SELECT * FROM profiles WHERE guild_id=? AND user_id=?", (guild_id, user_id))
-        assert row is not None
+    @staticmethod
+    def _row_to_profile(row: sqlite3.Row) -> ProfileData:
         return ProfileData(
             guild_id=row["guild_id"],
             user_id=row["user_id"],
@@ -191,11 +485,53 @@ class Database:
             updated_at=str_to_dt(row["updated_at"]),
             public_message_id=row["public_message_id"],
             vc_autopost_enabled=row["vc_autopost_enabled"],
+            public_content_hash=row["public_content_hash"],
         )
 
-    async def update_profile_fields(self, guild_id: int, user_id: int, *, name: str, condition: str, hobby: str, care: str, one: str) -> None:
+    async def peek_profile(self, guild_id: int, user_id: int) -> ProfileData | None:
+        """Read-only lookup; never creates a row."""
+        row = await self._fetchone("SELECT * FROM profiles WHERE guild_id=? AND user_id=?", (guild_id, user_id), name="peek_profile")
+        return self._row_to_profile(row) if row else None
+
+    async def get_or_create_profile(self, guild_id: int, user_id: int) -> ProfileData:
+        now = dt_to_str(utcnow())
+
+        def _run() -> sqlite3.Row:
+            conn = self.conn
+            conn.execute("""
+            INSERT INTO profiles(guild_id, user_id, state_updated_at, updated_at)
+            VALUES(?,?,?,?)
+            ON CONFLICT(guild_id, user_id) DO NOTHING
+            """, (guild_id, user_id, now, now)).close()
+            row = conn.execute("SELECT * FROM profiles WHERE guild_id=? AND user_id=?", (guild_id, user_id)).fetchone()
+            conn.commit()
+            return row
+        async with self._lock:
+            row = await self._submit(self._executor, _run, "get_or_create_profile")
+        return self._row_to_profile(row)
+
+    async def ensure_profile(self, guild_id: int, user_id: int, *, tx: Transaction | None = None) -> None:
         now = utcnow()
-        await self._exec("""
+        await self._write("""
+        INSERT INTO profiles(guild_id, user_id, state_updated_at, updated_at)
+        VALUES(?,?,?,?)
+        ON CONFLICT(guild_id, user_id) DO NOTHING
+        """, (guild_id, user_id, dt_to_str(now), dt_to_str(now)), name="ensure_profile", tx=tx)
+
+    async def update_profile_fields(
+        self,
+        guild_id: int,
+        user_id: int,
+        *,
+        name: str,
+        condition: str,
+        hobby: str,
+        care: str,
+        one: str,
+        tx: Transaction | None = None,
+    ) -> None:
+        now = utcnow()
+        await self._write("""
         UPDATE profiles SET
             name=?,
             condition=?,
@@ -204,26 +540,39 @@ class Database:
             one=?,
             updated_at=?
         WHERE guild_id=? AND user_id=?
-        """, (name, condition, hobby, care, one, dt_to_str(now), guild_id, user_id))
+        """, (name, condition, hobby, care, one, dt_to_str(now), guild_id, user_id), name="update_profile_fields", tx=tx)
 
     async def update_state(self, guild_id: int, user_id: int, state: str) -> None:
         now = utcnow()
         await self._exec("""
         UPDATE profiles SET state=?, state_updated_at=?
         WHERE guild_id=? AND user_id=?
-        """, (state, dt_to_str(now), guild_id, user_id))
+        """, (state, dt_to_str(now), guild_id, user_id), name="update_state")
+
+    async def set_public_message_id(
+        self,
+        guild_id: int,
+        user_id: int,
+        message_id: int | None,
+        *,
+        content_hash: str | None = None,
+    ) -> None:
+        await self._exec("""
+        UPDATE profiles SET public_message_id=?, public_content_hash=?
+        WHERE guild_id=? AND user_id=?
+        """, (message_id, content_hash, guild_id, user_id), name="set_public_message_id")
 
-    async def set_public_message_id(self, guild_id: int, user_id: int, message_id: int | None) -> None:
+    async def set_public_content_hash(self, guild_id: int, user_id: int, content_hash: str | None) -> None:
         await self._exec("""
-        UPDATE profiles SET public_message_id=?
+        UPDATE profiles SET public_content_hash=?
         WHERE guild_id=? AND user_id=?
-        """, (message_id, guild_id, user_id))
+        """, (content_hash, guild_id, user_id), name="set_public_content_hash")
 
     async def set_vc_autopost_enabled(self, guild_id: int, user_id: int, enabled: bool) -> None:
         await self._exec("""
         UPDATE profiles SET vc_autopost_enabled=?
         WHERE guild_id=? AND user_id=?
-        """, (1 if enabled else 0, guild_id, user_id))
+        """, (1 if enabled else 0, guild_id, user_id), name="set_vc_autopost_enabled")
 
     async def list_public_profiles_for_refresh(
         self,
@@ -237,29 +586,13 @@ class Database:
         WHERE guild_id=? AND public_message_id IS NOT NULL AND public_message_id > ?
         ORDER BY public_message_id ASC
         LIMIT ?
-        """, (guild_id, after_message_id, limit))
-        return [
-            ProfileData(
-                guild_id=row["guild_id"],
-                user_id=row["user_id"],
-                name=row["name"],
-                condition=row["condition"],
-                hobby=row["hobby"],
-                care=row["care"],
-                one=row["one"],
-                state=row["state"],
-                state_updated_at=str_to_dt(row["state_updated_at"]),
-                updated_at=str_to_dt(row["updated_at"]),
-                public_message_id=row["public_message_id"],
-                vc_autopost_enabled=row["vc_autopost_enabled"],
-            )
-            for row in rows
-        ]
+        """, (guild_id, after_message_id, limit), name="list_public_profiles_for_refresh")
+        return [self._row_to_profile(row) for row in rows]
 
     async def get_profile_refresh_cursor(self, guild_id: int) -> int:
         row = await self._fetchone("""
         SELECT last_public_message_id FROM profile_refresh_progress WHERE guild_id=?
-        """, (guild_id,))
+        """, (guild_id,), name="get_profile_refresh_cursor")
         if not row:
             return 0
         return int(row["last_public_message_id"] or 0)
@@ -270,14 +603,29 @@ class Database:
         VALUES(?,?)
         ON CONFLICT(guild_id) DO UPDATE SET
             last_public_message_id=excluded.last_public_message_id
-        """, (guild_id, last_public_message_id))
+        """, (guild_id, last_public_message_id), name="set_profile_refresh_cursor")
+
+    # command sync
+    async def get_command_sync_hashes(self) -> dict[str, str]:
+        """scope ('global' or 'guild:<id>') -> hash of the command tree last synced there"""
+        rows = await self._fetchall("SELECT scope, tree_hash FROM command_sync_state", name="get_command_sync_hashes")
+        return {row["scope"]: row["tree_hash"] for row in rows}
+
+    async def set_command_sync_hash(self, scope: str, tree_hash: str) -> None:
+        await self._exec("""
+        INSERT INTO command_sync_state(scope, tree_hash, synced_at)
+        VALUES(?,?,?)
+        ON CONFLICT(scope) DO UPDATE SET
+            tree_hash=excluded.tree_hash,
+            synced_at=excluded.synced_at
+        """, (scope, tree_hash, utcnow().isoformat()), name="set_command_sync_hash")
 
     # scheduled deletes
     async def schedule_delete(self, guild_id: int, channel_id: int, message_id: int, delete_at: datetime) -> None:
         await self._exec("""
         INSERT OR REPLACE INTO scheduled_deletes(guild_id, channel_id, message_id, delete_at)
         VALUES(?,?,?,?)
-        """, (guild_id, channel_id, message_id, dt_to_str(delete_at)))
+        """, (guild_id, channel_id, message_id, dt_to_str(delete_at)), name="schedule_delete")
 
     async def due_deletes(self, limit: int = 50) -> list[tuple[int,int,int,datetime]]:
         now = utcnow()
@@ -286,10 +634,35 @@ class Database:
         WHERE delete_at <= ?
         ORDER BY delete_at ASC
         LIMIT ?
-        """, (dt_to_str(now), limit))
+        """, (dt_to_str(now), limit), name="due_deletes")
         return [(r["guild_id"], r["channel_id"], r["message_id"], str_to_dt(r["delete_at"])) for r in rows]
 
-    async def remove_scheduled_delete(self, guild_id: int, channel_id: int, message_id: int) -> None:
-        await self._exec("""
+    async def remove_scheduled_delete(self, guild_id: int, channel_id: int, message_id: int, *, tx: Transaction | None = None) -> None:
+        await self._write("""
         DELETE FROM scheduled_deletes WHERE guild_id=? AND channel_id=? AND message_id=?
-        """, (guild_id, channel_id, message_id))
+        """, (guild_id, channel_id, message_id), name="remove_scheduled_delete", tx=tx)
+
+    async def remove_scheduled_deletes(self, keys: list[tuple[int, int, int]]) -> None:
+        async with self.transaction(name="remove_scheduled_deletes") as tx:
+            for guild_id, channel_id, message_id in keys:
+                await self.remove_scheduled_delete(guild_id, channel_id, message_id, tx=tx)
+
+    async def next_delete_at(self) -> datetime | None:
+        row = await self._fetchone("SELECT MIN(delete_at) AS next_at FROM scheduled_deletes", name="next_delete_at")
+        if not row or row["next_at"] is None:
+            return None
+        return str_to_dt(row["next_at"])
+
+    async def scheduled_delete_stats(self) -> tuple[int, int, datetime | None]:
+        """(pending rows, overdue rows, oldest overdue delete_at)"""
+        now = utcnow()
+        row = await self._fetchone("""
+        SELECT
+            COUNT(*) AS pending,
+            COALESCE(SUM(delete_at <= ?), 0) AS overdue,
+            MIN(CASE WHEN delete_at <= ? THEN delete_at END) AS oldest
+        FROM scheduled_deletes
+        """, (dt_to_str(now), dt_to_str(now)), name="scheduled_delete_stats")
+        assert row is not None
+        oldest = str_to_dt(row["oldest"]) if row["oldest"] else None
+        return int(row["pending"]), int(row["overdue"]), oldest
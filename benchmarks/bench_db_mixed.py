@@ -0,0 +1,58 @@
+"""
+Mixed read/write throughput: single-lock Database vs WAL + read pool.
+
+    python -m benchmarks.bench_db_mixed
+"""
+from __future__ import annotations
+import asyncio
+import os
+import tempfile
+import time
+
+from app.storage.db import Database
+
+USERS = 500
+WRITERS = 8
+READERS = 32
+OPS_PER_TASK = 200
+
+
+async def _bench(wal: bool) -> tuple[float, float]:
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    db = Database(path, wal=wal)
+    await db.connect()
+    try:
+        for uid in range(USERS):
+            await db.get_or_create_profile(1, uid)
+
+        async def writer(w: int) -> None:
+            for i in range(OPS_PER_TASK):
+                uid = (w * OPS_PER_TASK + i) % USERS
+                await db.update_profile_fields(1, uid, name=f"n{i}", condition="", hobby="", care="", one="")
+
+        async def reader(r: int) -> None:
+            for i in range(OPS_PER_TASK):
+                await db.peek_profile(1, (r * 7 + i) % USERS)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(writer(w) for w in range(WRITERS)), *(reader(r) for r in range(READERS)))
+        elapsed = time.perf_counter() - t0
+        total = (WRITERS + READERS) * OPS_PER_TASK
+        return total / elapsed, elapsed
+    finally:
+        await db.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+
+
+async def main() -> None:
+    single, single_s = await _bench(wal=False)
+    pooled, pooled_s = await _bench(wal=True)
+    print(f"single lock : {single:>10,.0f} ops/sec ({single_s:.2f}s)")
+    print(f"WAL + pool  : {pooled:>10,.0f} ops/sec ({pooled_s:.2f}s, {pooled / single:.1f}x)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+"""
+Stress test: push millions of distinct keys through the rate limiters and check that
+traced memory stays flat once the TTL / max_entries bound is reached.
+
+    python -m benchmarks.bench_limiter_memory
+"""
+from __future__ import annotations
+import time
+import tracemalloc
+
+from app.services.rate_limit import RateLimiter
+from app.services.vc_autopost import VCAutoPostLimiter
+
+KEYS = 3_000_000
+KEYS_PER_SEC = 5_000  # simulated arrival rate
+CHECKPOINTS = 6
+
+
+def main() -> None:
+    now = [0.0]
+    clock = lambda: now[0]
+    rl = RateLimiter(clock=clock)
+    vc = VCAutoPostLimiter(clock=clock)
+
+    tracemalloc.start()
+    samples: list[int] = []
+    t0 = time.perf_counter()
+    step = KEYS // CHECKPOINTS
+    for i in range(KEYS):
+        now[0] = i / KEYS_PER_SEC
+        rl.allow(1, i, "modal_save")
+        vc.allow(1, i, i % 50)
+        if (i + 1) % step == 0:
+            current, _ = tracemalloc.get_traced_memory()
+            samples.append(current)
+            print(
+                f"{i + 1:>10,} keys  traced={current / 1e6:7.1f} MB  "
+                f"entries rl={len(rl._last):,} vc_global={len(vc._last_global):,} vc={len(vc._last_vc):,}"
+            )
+    elapsed = time.perf_counter() - t0
+    tracemalloc.stop()
+    print(f"{KEYS / elapsed:,.0f} keys/sec")
+
+    # Once the bound is reached (first checkpoint), memory must not keep growing.
+    steady = samples[1:]
+    assert max(steady) <= min(steady) * 1.10, f"memory grew: {[s // 1_000_000 for s in samples]} MB"
+    print("OK: memory flat")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Micro-benchmark for CookieProfileBot.on_message on messages outside the profile channel.
+
+    python -m benchmarks.bench_on_message
+"""
+from __future__ import annotations
+import asyncio
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+
+from app.config import AppConfig
+from app.discord_app.bot import CookieProfileBot
+
+N = 200_000
+GUILDS = 200
+
+
+async def legacy_on_message(bot: CookieProfileBot, message) -> None:
+    # The handler as it was before the channel index: one config lookup per message.
+    if message.guild is None:
+        return
+    if message.author.bot:
+        return
+    cfg = await bot.db.get_guild_config(message.guild.id)
+    if not cfg.channel_id:
+        return
+    if message.channel.id != cfg.channel_id:
+        return
+
+
+async def _run(handler, bot: CookieProfileBot, messages) -> float:
+    t0 = time.perf_counter()
+    for m in messages:
+        await handler(m)
+    return len(messages) / (time.perf_counter() - t0)
+
+
+async def main() -> None:
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    bot = CookieProfileBot(AppConfig("bench", path, None))
+    await bot.db.connect()
+    try:
+        for gid in range(1, GUILDS + 1):
+            await bot.db.set_guild_config(gid, channel_id=gid * 1000, log_channel_id=None)
+        author = SimpleNamespace(bot=False)
+        messages = [
+            SimpleNamespace(
+                id=i,
+                guild=SimpleNamespace(id=(i % GUILDS) + 1),
+                channel=SimpleNamespace(id=((i % GUILDS) + 1) * 1000 + 1),
+                author=author,
+            )
+            for i in range(N)
+        ]
+        legacy = await _run(lambda m: legacy_on_message(bot, m), bot, messages)
+        current = await _run(bot.on_message, bot, messages)
+        print(f"legacy  on_message: {legacy:>12,.0f} events/sec")
+        print(f"indexed on_message: {current:>12,.0f} events/sec ({current / legacy:.1f}x)")
+    finally:
+        await bot.db.close()
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+Database.connect() on a 1M-profile database: unversioned boot (baseline schema pass with
+its full-table UPDATEs, as every restart used to run) vs. an up-to-date PRAGMA user_version.
+
+    python -m benchmarks.bench_startup
+"""
+from __future__ import annotations
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+from app.storage.db import Database
+
+PROFILES = 1_000_000
+GUILDS = 50
+
+
+def _populate(path: str) -> None:
+    conn = sqlite3.connect(path)
+    ts = "2026-01-01T00:00:00+00:00"
+    rows = ((i % GUILDS, i, f"name{i}", ts, ts, 10_000 + i) for i in range(PROFILES))
+    conn.executemany(
+        "INSERT INTO profiles(guild_id, user_id, name, state_updated_at, updated_at, public_message_id) VALUES(?,?,?,?,?,?)",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+
+
+def _set_user_version(path: str, version: int) -> None:
+    conn = sqlite3.connect(path)
+    conn.execute(f"PRAGMA user_version={version}")
+    conn.commit()
+    conn.close()
+
+
+async def _connect_time(path: str) -> float:
+    db = Database(path)
+    t0 = time.perf_counter()
+    await db.connect()
+    elapsed = time.perf_counter() - t0
+    await db.close()
+    return elapsed
+
+
+async def main() -> None:
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        db = Database(path)
+        await db.connect()
+        await db.close()
+        print(f"populating {PROFILES:,} profiles ...")
+        _populate(path)
+
+        _set_user_version(path, 0)
+        unversioned = await _connect_time(path)
+        versioned = await _connect_time(path)
+        print(f"unversioned boot : {unversioned * 1000:>9.1f} ms")
+        print(f"versioned boot   : {versioned * 1000:>9.1f} ms ({unversioned / versioned:.0f}x faster)")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
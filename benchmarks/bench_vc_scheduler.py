@@ -0,0 +1,100 @@
+"""
+Load test for delayed VC autoposts: one sleeping Task per join (old) vs one TimerHeap (new).
+Simulates 10k joins per minute from members hopping between VCs, with time compressed
+by SPEEDUP (the 10s autopost delay and the arrival rate are scaled together).
+
+    python -m benchmarks.bench_vc_scheduler
+"""
+from __future__ import annotations
+import asyncio
+import random
+import time
+
+from app.services.scheduler import TimerHeap
+
+JOINS_PER_MIN = 10_000
+MEMBERS = 3_000
+DELAY_SEC = 10.0
+SPEEDUP = 20.0
+SIM_MINUTES = 1.0
+
+_delay = DELAY_SEC / SPEEDUP
+_interval = 60.0 / JOINS_PER_MIN / SPEEDUP
+_total = int(JOINS_PER_MIN * SIM_MINUTES)
+
+
+async def _drive(join, stats: dict) -> None:
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for i in range(_total):
+        join((1, rng.randrange(MEMBERS)))
+        if i % 50 == 0:
+            stats["peak_tasks"] = max(stats["peak_tasks"], len(asyncio.all_tasks()))
+            # keep arrivals on schedule
+            target = start + i * _interval
+            await asyncio.sleep(max(0.0, target - time.perf_counter()))
+    await asyncio.sleep(_delay * 1.5)
+
+
+async def legacy() -> dict:
+    stats = {"peak_tasks": 0, "fired": 0, "created": 0}
+    tasks: dict[tuple[int, int], asyncio.Task] = {}
+
+    def join(key) -> None:
+        existing = tasks.get(key)
+        if existing:
+            existing.cancel()
+
+        async def delayed() -> None:
+            try:
+                await asyncio.sleep(_delay)
+                stats["fired"] += 1
+            finally:
+                if tasks.get(key) is task:
+                    tasks.pop(key, None)
+
+        task = asyncio.create_task(delayed())
+        stats["created"] += 1
+        tasks[key] = task
+
+    await _drive(join, stats)
+    return stats
+
+
+async def heap() -> dict:
+    stats = {"peak_tasks": 0, "fired": 0, "created": 0, "peak_depth": 0}
+
+    async def fire(key, value) -> None:
+        stats["fired"] += 1
+
+    timers: TimerHeap = TimerHeap(fire)
+    timers.start()
+
+    def join(key) -> None:
+        timers.schedule(key, _delay, None)
+        stats["peak_depth"] = max(stats["peak_depth"], timers.depth)
+
+    await _drive(join, stats)
+    await timers.stop()
+    stats["created"] = stats["fired"]  # one short-lived task per fired post
+    return stats
+
+
+def _measure(fn) -> tuple[dict, float]:
+    cpu0 = time.process_time()
+    stats = asyncio.run(fn())
+    return stats, time.process_time() - cpu0
+
+
+def main() -> None:
+    for name, fn in (("task-per-join", legacy), ("timer-heap", heap)):
+        stats, cpu = _measure(fn)
+        extra = f" peak_depth={stats['peak_depth']}" if "peak_depth" in stats else ""
+        print(
+            f"{name:<14} cpu={cpu:6.2f}s tasks_created={stats['created']:>6} "
+            f"peak_tasks={stats['peak_tasks']:>5} fired={stats['fired']}{extra}"
+        )
+
+
+if __name__ == "__main__":
+    main()
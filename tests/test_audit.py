@@ -1,6 +1,11 @@
+import asyncio
+import gzip
+import json
+import os
+import tempfile
 import unittest
 from datetime import datetime
-from app.services.audit import make_log_line
+from app.services.audit import AuditBatcher, AuditEvent, DiscordAuditSink, JsonlAuditSink, make_log_line, pack_log_lines
 
 class TestAudit(unittest.TestCase):
     def test_format(self):
@@ -8,3 +13,102 @@ class TestAudit(unittest.TestCase):
         self.assertIn("[Profile]", line)
         self.assertIn("guild=1", line)
         self.assertIn("user=2", line)
+
+
+    def test_event_line_matches_make_log_line(self):
+        kw = dict(ts=datetime(2026,1,1,12,0), guild_id=1, user_id=2, action="post", channel_id=None, result="ng", reason="x")
+        self.assertEqual(AuditEvent(**kw).to_line(), make_log_line(**kw))
+        self.assertEqual(json.loads(AuditEvent(**kw).to_json())["ts"], "2026-01-01T12:00:00")
+
+class TestJsonlAuditSink(unittest.IsolatedAsyncioTestCase):
+    def _event(self, i: int) -> AuditEvent:
+        return AuditEvent(ts=datetime(2026,1,1), guild_id=1, user_id=i, action="edit_modal", channel_id=3, result="ok")
+
+    async def test_writes_and_rotates(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "audit.jsonl")
+            sink = JsonlAuditSink(path, max_bytes=2000, backups=2)
+            sink.start()
+            for i in range(100):
+                sink.emit(self._event(i))
+            await sink.stop()
+
+            self.assertEqual(sink.written, 100)
+            self.assertGreater(sink.rotations, 0)
+            self.assertFalse(os.path.exists(path + ".3.gz"))
+            with gzip.open(path + ".1.gz", "rt", encoding="utf-8") as f:
+                rotated = [json.loads(line) for line in f]
+            self.assertEqual(rotated[0]["action"], "edit_modal")
+            with open(path, encoding="utf-8") as f:
+                current = [json.loads(line) for line in f]
+            self.assertEqual((rotated + current)[-1]["user_id"], 99)  # newest events are never the ones rotated away
+
+    async def test_stop_does_not_hang_when_writer_cannot_open(self):
+        with tempfile.NamedTemporaryFile() as not_a_dir:
+            sink = JsonlAuditSink(os.path.join(not_a_dir.name, "audit.jsonl"), max_queue=2)
+            sink.start()
+            for i in range(5):
+                sink.emit(self._event(i))
+            await asyncio.wait_for(sink.stop(), 5)
+        self.assertEqual(sink.written, 0)
+
+    async def test_drops_when_queue_full(self):
+        sink = JsonlAuditSink(os.devnull, max_queue=2)  # not started: nothing drains the queue
+        for i in range(5):
+            sink.emit(self._event(i))
+        self.assertEqual(sink.dropped, 3)
+
+class TestAuditBatcher(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.sent: list[tuple[int, str]] = []
+
+        async def send(channel_id, text):
+            self.sent.append((channel_id, text))
+        self.send = send
+
+    def test_pack_respects_limit(self):
+        chunks = pack_log_lines(["x" * 90] * 50, max_chars=1000)
+        self.assertTrue(all(len(c) <= 1000 and c.startswith("```") for c in chunks))
+        self.assertEqual(sum(c.count("x" * 90) for c in chunks), 50)
+        self.assertEqual(len(pack_log_lines(["y" * 5000])[0]), 2000)  # an oversized line is truncated
+
+    async def test_flushes_when_near_limit(self):
+        b = AuditBatcher(self.send, interval=3600)
+        b.start()
+        for _ in range(30):
+            b.add(1, "z" * 80)
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        self.assertEqual((len(self.sent), b.pending), (2, 0))  # 2,430 chars -> two full messages, no timer wait
+        self.assertTrue(all(len(t) <= 2000 for _, t in self.sent))
+        self.assertEqual(sum(t.count("z" * 80) for _, t in self.sent), 30)
+        await b.stop()
+
+    async def test_flushes_after_interval_per_channel(self):
+        b = AuditBatcher(self.send, interval=0.01)
+        b.start()
+        b.add(1, "a")
+        b.add(1, "b")
+        b.add(2, "c")
+        await asyncio.sleep(0.05)
+        self.assertEqual(sorted(self.sent), [(1, "```\na\nb\n```"), (2, "```\nc\n```")])
+        await b.stop()
+
+    async def test_overflow_drops_and_stop_flushes(self):
+        b = AuditBatcher(self.send, interval=3600, max_pending=3)
+        for i in range(5):
+            b.add(1, str(i))
+        self.assertEqual((b.pending, b.dropped), (3, 2))
+        await b.stop()
+        self.assertEqual(self.sent, [(1, "```\n0\n1\n2\n```")])
+        self.assertEqual(b.pending, 0)
+
+    async def test_discord_sink_routes_to_guild_log_channel(self):
+        sink = DiscordAuditSink(AuditBatcher(self.send, interval=3600), {1: 10, 2: None}.get)
+        for gid in (1, 2, 3, 1):
+            sink.emit(AuditEvent(ts=datetime(2026,1,1,12,0), guild_id=gid, user_id=5, action="post", channel_id=None, result="ok"))
+        sink.start()
+        await sink.stop()
+        self.assertEqual(len(self.sent), 1)
+        self.assertEqual(self.sent[0][0], 10)
+        self.assertEqual(self.sent[0][1].count("guild=1 "), 2)
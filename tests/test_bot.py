@@ -0,0 +1,472 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import discord
+
+from app.config import AppConfig
+from app.discord_app.bot import REFRESH_CONCURRENCY, CookieProfileBot, SetupCommands
+
+
+def _message_payload(message_id: int, channel_id: int) -> dict:
+    return {
+        "id": str(message_id),
+        "channel_id": str(channel_id),
+        "type": 0,
+        "content": "",
+        "author": {"id": "1", "username": "bot", "discriminator": "0", "avatar": None, "bot": True},
+        "attachments": [],
+        "embeds": [],
+        "mentions": [],
+        "mention_roles": [],
+        "pinned": False,
+        "mention_everyone": False,
+        "tts": False,
+        "timestamp": "2026-01-01T00:00:00+00:00",
+        "edited_timestamp": None,
+        "flags": 0,
+        "components": [],
+    }
+
+
+class FakeHTTP:
+    """Stands in for HTTPClient.request and records every REST call the bot makes."""
+    def __init__(self):
+        self.calls: list[tuple[str, str]] = []
+        self.payloads: list[dict | None] = []
+        self.missing: set[int] = set()
+        self.forbidden_channels: set[int] = set()
+        self.forbidden_paths: set[str] = set()
+        self.latency = 0.0
+        self._next_id = 10_000
+
+    async def request(self, route, **kwargs):
+        self.calls.append((route.method, route.path))
+        self.payloads.append(kwargs.get("json"))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        tail = route.url.rstrip("/").rsplit("/", 1)[-1]
+        message_id = int(tail) if "/messages/" in route.url and tail.isdigit() else None
+        if any(f"/channels/{cid}/" in route.url for cid in self.forbidden_channels) or any(
+            route.url.endswith(p) for p in self.forbidden_paths
+        ):
+            raise discord.Forbidden(SimpleNamespace(status=403, reason="Forbidden"), {"code": 50013, "message": "Missing Permissions"})
+        if message_id in self.missing:
+            raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), {"code": 10008, "message": "Unknown Message"})
+        if route.method == "POST":
+            self._next_id += 1
+            return _message_payload(self._next_id, 0)
+        if route.method == "PATCH":
+            return _message_payload(int(message_id or 0), 0)
+        return None
+
+
+def _user(uid: int):
+    return SimpleNamespace(id=uid, display_name=f"user{uid}", display_avatar=None)
+
+
+class BotTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.NamedTemporaryFile(delete=False)
+        self.tmp.close()
+        self.bot = CookieProfileBot(AppConfig("token", self.tmp.name, None))
+        self.http = FakeHTTP()
+        self.bot.http.request = self.http.request
+        self.bot.get_guild = lambda gid: CachedGuild(gid)  # as after READY: every member is cached
+        await self.bot.db.connect()
+
+    async def asyncTearDown(self):
+        await self.bot.db.close()
+        os.unlink(self.tmp.name)
+
+    async def save_profile(self, gid: int, uid: int, *, name: str = "name", public_message_id: int | None = None):
+        await self.bot.db.ensure_profile(gid, uid)
+        await self.bot.db.update_profile_fields(gid, uid, name=name, condition="", hobby="", care="", one="")
+        if public_message_id:
+            await self.bot.db.set_public_message_id(gid, uid, public_message_id)
+
+
+class CachedGuild:
+    def __init__(self, gid: int):
+        self.id = gid
+
+    def get_member(self, uid):
+        return _user(uid)
+
+
+class TestFetchFreeMessages(BotTestCase):
+    async def test_upsert_edits_without_fetch(self):
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        await self.save_profile(1, 2, public_message_id=555)
+        interaction = SimpleNamespace(guild_id=1, user=_user(2))
+
+        await self.bot.upsert_public_profile(interaction)
+        self.assertEqual([m for m, _ in self.http.calls], ["PATCH"])
+
+    async def test_upsert_reposts_on_not_found(self):
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        await self.save_profile(1, 2, public_message_id=555)
+        self.http.missing.add(555)
+        interaction = SimpleNamespace(guild_id=1, user=_user(2))
+
+        await self.bot.upsert_public_profile(interaction)
+        self.assertEqual([m for m, _ in self.http.calls], ["PATCH", "POST"])
+        prof = await self.bot.db.peek_profile(1, 2)
+        self.assertNotEqual(prof.public_message_id, 555)
+
+    async def test_panel_bump_sends_and_deletes_without_fetch(self):
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        await self.bot.db.set_panel_message_id(1, 777)
+
+        await self.bot._post_panel(1)
+        self.assertEqual([m for m, _ in self.http.calls], ["POST", "DELETE"])
+        cfg = await self.bot.db.get_guild_config(1)
+        self.assertNotEqual(cfg.panel_message_id, 777)
+
+    async def test_bulk_delete_forbidden_falls_back_to_single_deletes(self):
+        now = discord.utils.utcnow()
+        ids = [discord.utils.time_snowflake(now) + i for i in range(3)]
+        self.http.forbidden_paths.add("/bulk-delete")  # no Manage Messages
+
+        await self.bot._delete_channel_messages(100, ids)
+        self.assertEqual([m for m, _ in self.http.calls], ["POST", "DELETE", "DELETE", "DELETE"])
+        self.assertTrue(all(p.endswith("/messages/{message_id}") for _, p in self.http.calls[1:]))
+
+    async def test_refresh_edits_by_id(self):
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        for uid in (2, 3, 4):
+            await self.save_profile(1, uid, public_message_id=500 + uid)
+
+        refreshed = await self.bot.refresh_public_profiles(1)
+        self.assertEqual(refreshed, 3)
+        message_calls = [(m, p) for m, p in self.http.calls if "/messages/" in p]
+        self.assertEqual([m for m, _ in message_calls], ["PATCH"] * 3)
+
+
+class TestCircuitBreaker(BotTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.audits: list[dict] = []
+
+        async def audit_system(**kwargs):
+            self.audits.append(kwargs)
+        self.bot.audit_system = audit_system
+
+    async def test_forbidden_panel_channel_short_circuits(self):
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        self.http.forbidden_channels.add(100)
+
+        for _ in range(5):
+            await self.bot._post_panel(1)
+        self.assertEqual(len(self.http.calls), 3)  # threshold, then no more requests
+        self.assertEqual([a["action"] for a in self.audits], ["circuit_open"])
+        self.assertIn("channel=100 permission", self.audits[0]["reason"])
+
+    async def test_missing_message_stops_refresh_edits(self):
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        await self.save_profile(1, 2, public_message_id=502)
+        self.http.missing.add(502)
+
+        for _ in range(5):
+            await self.bot.refresh_profile_batch(1, 50)
+        patches = [p for m, p in self.http.calls if m == "PATCH"]
+        self.assertEqual(len(patches), 3)
+        self.assertEqual(len(self.audits), 1)
+        self.assertIn("message=502 not_found", self.audits[0]["reason"])
+
+    async def test_concurrent_batch_stops_at_open_circuit(self):
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        for uid in range(2, 27):
+            await self.save_profile(1, uid, public_message_id=500 + uid)
+        self.http.forbidden_channels.add(100)
+        self.http.latency = 0.01  # PATCHes overlap, as they do against Discord
+
+        await self.bot.refresh_profile_batch(1, 50)
+        patches = [p for m, p in self.http.calls if m == "PATCH"]
+        # Calls started before the third failure opened the circuit; none after.
+        self.assertLessEqual(len(patches), REFRESH_CONCURRENCY + self.bot.circuits.threshold - 1)
+        backoff = self.bot.circuits.open_circuits()[("channel", 100)][0]
+        self.assertTrue(50 < backoff <= self.bot.circuits.base_backoff)  # opened once, not escalated
+        self.assertEqual(len(self.audits), 1)
+
+    async def test_setup_run_clears_channel_circuit(self):
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        self.http.forbidden_channels.add(100)
+        for _ in range(3):
+            await self.bot._post_panel(1)
+        self.assertFalse(self.bot.circuits.allow(("channel", 100)))
+
+        self.http.forbidden_channels.clear()  # an admin fixed the permissions and re-ran setup
+
+        async def noop(*args, **kwargs):
+            pass
+        interaction = SimpleNamespace(guild_id=1, response=SimpleNamespace(defer=noop), followup=SimpleNamespace(send=noop))
+        group = SetupCommands(self.bot)
+        await group.run.callback(group, interaction, self.bot._messageable(100, guild_id=1), None)
+        self.assertTrue(self.bot.circuits.allow(("channel", 100)))
+
+        self.http.calls.clear()
+        await self.bot._post_panel(1)
+        self.assertIn("POST", [m for m, _ in self.http.calls])
+
+
+class TestStalePanels(BotTestCase):
+    def _click(self, message_id: int):
+        return SimpleNamespace(guild_id=1, message=SimpleNamespace(id=message_id, channel=SimpleNamespace(id=100)))
+
+    async def test_stale_clicks_are_batched_into_one_delete(self):
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        now = discord.utils.utcnow()
+        old1, old2, latest = (discord.utils.time_snowflake(now) + i for i in range(3))
+        await self.bot.db.set_panel_message_id(1, latest)
+
+        self.assertFalse(self.bot.check_stale_panel(self._click(latest)))
+        self.assertTrue(self.bot.check_stale_panel(self._click(old1)))
+        self.assertTrue(self.bot.check_stale_panel(self._click(old2)))
+        self.assertEqual(self.http.calls, [])  # nothing on the interaction path
+        self.assertEqual(self.bot.stale_panel_deleter.pending, 1)
+
+        await self.bot._delete_stale_panels(100)
+        self.assertEqual([m for m, _ in self.http.calls], ["POST"])
+        self.assertTrue(self.http.calls[0][1].endswith("/bulk-delete"))
+
+    async def test_stale_panels_deleted_without_manage_messages(self):
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        now = discord.utils.utcnow()
+        old1, old2, latest = (discord.utils.time_snowflake(now) + i for i in range(3))
+        await self.bot.db.set_panel_message_id(1, latest)
+        self.http.forbidden_paths.add("/bulk-delete")
+
+        self.bot.check_stale_panel(self._click(old1))
+        self.bot.check_stale_panel(self._click(old2))
+        await self.bot._delete_stale_panels(100)
+        self.assertEqual([m for m, _ in self.http.calls], ["POST", "DELETE", "DELETE"])
+
+
+class TestCommandSync(BotTestCase):
+    async def test_sync_only_changed_or_new_scopes(self):
+        synced: list[int | None] = []
+
+        async def sync(*, guild=None):
+            synced.append(guild.id if guild else None)
+            return []
+        self.bot.tree.sync = sync
+
+        self.assertEqual(await self.bot.sync_commands([1, 2], include_global=True), (3, 3))
+        self.assertEqual(sorted(synced, key=str), [1, 2, None])
+
+        synced.clear()
+        self.assertEqual(await self.bot.sync_commands([1, 2, 3], include_global=True), (1, 4))
+        self.assertEqual(synced, [3])  # only the new guild
+
+        @self.bot.tree.command(name="extra", description="x")
+        async def extra(interaction: discord.Interaction) -> None:
+            pass
+        synced.clear()
+        self.assertEqual(await self.bot.sync_commands([1], include_global=True), (2, 2))
+
+
+class TestContentFingerprint(BotTestCase):
+    async def test_upsert_skips_unchanged_edit(self):
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        await self.save_profile(1, 2)
+        interaction = SimpleNamespace(guild_id=1, user=_user(2))
+
+        await self.bot.upsert_public_profile(interaction)  # first post
+        await self.bot.upsert_public_profile(interaction)  # nothing changed
+        self.assertEqual([m for m, _ in self.http.calls], ["POST"])
+
+        await self.save_profile(1, 2, name="renamed")
+        await self.bot.upsert_public_profile(interaction)
+        self.assertEqual([m for m, _ in self.http.calls], ["POST", "PATCH"])
+
+    async def test_refresh_skips_unchanged_profiles(self):
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        for uid in (2, 3):
+            await self.save_profile(1, uid, public_message_id=500 + uid)
+
+        self.assertEqual(await self.bot.refresh_public_profiles(1), 2)
+        patches = sum(1 for m, _ in self.http.calls if m == "PATCH")
+        await self.bot.db.set_profile_refresh_cursor(1, 0)
+        self.assertEqual(await self.bot.refresh_public_profiles(1), 0)
+        self.assertEqual(sum(1 for m, _ in self.http.calls if m == "PATCH"), patches)
+
+
+class TestRefreshBatch(BotTestCase):
+    async def test_guild_missing_from_cache_is_skipped(self):
+        self.bot.get_guild = lambda gid: None  # before READY
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        await self.save_profile(1, 2, public_message_id=502)
+
+        res = await self.bot.refresh_profile_batch(1, 50)
+        self.assertEqual((res.visited, res.wrapped), (0, True))
+        self.assertEqual(self.http.calls, [])
+        self.assertNotIn((1, 2), self.bot.display_cache)
+
+    async def test_cursor_checkpoints_and_wraps(self):
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        for uid in (2, 3, 4):
+            await self.save_profile(1, uid, public_message_id=500 + uid)
+
+        first = await self.bot.refresh_profile_batch(1, 2)
+        self.assertEqual((first.visited, first.wrapped), (2, False))
+        self.assertEqual(await self.bot.db.get_profile_refresh_cursor(1), 503)
+
+        second = await self.bot.refresh_profile_batch(1, 2)
+        self.assertEqual((second.visited, second.wrapped), (1, True))
+        self.assertEqual(await self.bot.db.get_profile_refresh_cursor(1), 0)
+
+
+class TestDirtyRerender(BotTestCase):
+    def _member(self, name: str, avatar: str):
+        return SimpleNamespace(id=2, bot=False, guild=SimpleNamespace(id=1), display_name=name, display_avatar=SimpleNamespace(url=avatar))
+
+    async def test_member_update_marks_and_rerenders(self):
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        await self.save_profile(1, 2, public_message_id=502)
+
+        await self.bot.on_member_update(self._member("a", "x"), self._member("a", "x"))
+        self.assertEqual(self.bot.profile_rerender.pending, 0)
+        await self.bot.on_member_update(self._member("a", "x"), self._member("b", "x"))
+        self.assertEqual(self.bot.profile_rerender.pending, 1)
+
+        await self.bot.profile_rerender.drain([(1, 2), (1, 3)])  # (1, 3) has no profile
+        self.assertEqual([m for m, _ in self.http.calls if m == "PATCH"], ["PATCH"])
+
+    async def test_unconfigured_guild_is_ignored(self):
+        await self.bot.on_member_update(self._member("a", "x"), self._member("b", "y"))
+        self.assertEqual(self.bot.profile_rerender.pending, 0)
+
+
+class FakeGuild:
+    def __init__(self, gid: int, members: dict[int, str]):
+        self.id = gid
+        self.members = members
+        self.queries: list[list[int]] = []
+        self.member_fetches = 0
+
+    def get_member(self, uid):
+        return None  # nothing in the gateway cache
+
+    async def query_members(self, *, user_ids, limit, cache):
+        self.queries.append(list(user_ids))
+        return [
+            SimpleNamespace(id=uid, display_name=self.members[uid], display_avatar=None)
+            for uid in user_ids if uid in self.members
+        ]
+
+    async def fetch_member(self, uid):
+        self.member_fetches += 1
+        raise discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), {"code": 10007, "message": "Unknown Member"})
+
+
+class TestStats(BotTestCase):
+    async def test_format_stats_covers_every_accessor(self):
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        await self.bot.db.get_guild_config(1)
+        self.bot.defer_stats.handler("profile_edit").calls += 1
+
+        out = await self.bot.format_stats()
+        head, *queries = out.splitlines()
+        self.assertTrue(head.startswith("[ProfileBot] stats jobs(pending=0 "))
+        for section in ("deletes(pending=0 ", "display(size=0 ", "guild_cfg(size=1 hits=1 ", "defer:profile_edit(calls=1 deferred=0 late=0)"):
+            self.assertIn(section, head)
+        self.assertTrue(any(q.startswith("  set_guild_config: count=1 ") for q in queries))
+
+
+class TestShutdown(BotTestCase):
+    async def test_close_stops_producers_before_draining_jobs(self):
+        order = []
+        services = {
+            "vc_timers": self.bot.vc_autopost_timers, "vc_flush": self.bot.vc_autopost_flush_timers,
+            "panel_bumper": self.bot.panel_bumper, "stale_panels": self.bot.stale_panel_deleter,
+            "rerender": self.bot.profile_rerender, "refresh": self.bot.refresh_engine,
+            "deletes": self.bot.delete_worker, "jobs": self.bot.jobs, "audit": self.bot.audit_discord,
+            "db": self.bot.db,
+        }
+        for name, service in services.items():
+            method = "close" if name == "db" else "stop"
+            original = getattr(service, method)
+
+            async def record(*args, _name=name, _original=original, **kwargs):
+                order.append(_name)
+                await _original(*args, **kwargs)
+            setattr(service, method, record)
+
+        await self.bot.close()
+        self.assertEqual(set(order[:7]), {"vc_timers", "vc_flush", "panel_bumper", "stale_panels", "rerender", "refresh", "deletes"})
+        self.assertEqual(order[7:], ["jobs", "audit", "db"])
+
+
+class TestVCAutopostAggregation(BotTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.vc = self.bot._messageable(300, guild_id=1)  # a VC with its built-in text chat
+        self.bot.jobs.start()
+        self.bot.vc_autopost_flush_timers.start()
+
+    async def asyncTearDown(self):
+        await self.bot.vc_autopost_flush_timers.stop()
+        await self.bot.jobs.stop()
+        await super().asyncTearDown()
+
+    async def fire(self, uid: int):
+        await self.save_profile(1, uid, name=f"name{uid}")
+        member = SimpleNamespace(
+            id=uid, guild=SimpleNamespace(id=1), voice=SimpleNamespace(channel=self.vc),
+            display_name=f"user{uid}", display_avatar=None,
+        )
+        await self.bot._fire_vc_autopost((1, uid), (member, self.vc))
+
+    def posts(self) -> list[dict]:
+        return [p for (m, _), p in zip(self.http.calls, self.http.payloads) if m == "POST"]
+
+    async def test_members_due_together_share_one_message(self):
+        with mock.patch("app.discord_app.bot.VC_AUTOPOST_BATCH_WINDOW_SEC", 0.05):
+            for uid in (2, 3, 4):
+                await self.fire(uid)
+            self.assertIn(300, self.bot.vc_autopost_flush_timers)  # armed by the first member only
+            self.assertEqual(self.posts(), [])
+            await asyncio.sleep(0.1)
+            await self.bot.jobs.stop()
+        posts = self.posts()
+        self.assertEqual(len(posts), 1)
+        self.assertEqual(len(posts[0]["embeds"]), 3)
+        self.assertEqual(posts[0]["content"], "🍪Profile <@2> <@3> <@4>")
+
+    async def test_full_batch_sends_early_and_cancels_timer(self):
+        for uid in range(2, 12):  # ten embeds: Discord's per-message limit
+            await self.fire(uid)
+        self.assertNotIn(300, self.bot.vc_autopost_flush_timers)
+        await self.bot.jobs.stop()
+        posts = self.posts()
+        self.assertEqual(len(posts), 1)
+        self.assertEqual(len(posts[0]["embeds"]), 10)
+
+        await self.fire(12)  # the next member starts a new window
+        self.assertIn(300, self.bot.vc_autopost_flush_timers)
+
+
+class TestDisplayResolution(BotTestCase):
+    async def test_batch_query_then_cache(self):
+        guild = FakeGuild(1, {2: "two", 3: "three"})
+        self.bot.get_guild = lambda gid: guild if gid == 1 else None
+        await self.bot.db.set_guild_config(1, channel_id=100, log_channel_id=None)
+        for uid in (2, 3, 4):  # 4 has left the guild
+            await self.save_profile(1, uid, public_message_id=500 + uid)
+
+        await self.bot.refresh_profile_batch(1, 50)
+        self.assertEqual(guild.queries, [[2, 3, 4]])
+        user_lookups = [p for m, p in self.http.calls if m == "GET" and p.startswith("/users/")]
+        self.assertEqual(len(user_lookups), 1)  # only the departed member falls back to REST
+        self.assertEqual(guild.member_fetches, 0)  # the query already showed they left
+
+        await self.bot.refresh_profile_batch(1, 50)
+        self.assertEqual(guild.queries, [[2, 3, 4], [4]])
+        stats = self.bot.display_cache.stats()
+        self.assertEqual(self.bot.display_cache.gateway_resolved, 2)
+        self.assertGreaterEqual(stats["rest_calls_saved"], 6)
+        self.assertEqual(self.bot.display_cache.not_member_skips, 2)
@@ -0,0 +1,50 @@
+import unittest
+
+from app.services.circuit import CircuitBreaker
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_opens_after_threshold_and_backs_off(self):
+        now = [0.0]
+        cb = CircuitBreaker(threshold=2, base_backoff=10, max_backoff=25, clock=lambda: now[0])
+        key = ("channel", 1)
+        self.assertFalse(cb.record_failure(key, "permission"))
+        self.assertTrue(cb.allow(key))
+        self.assertTrue(cb.record_failure(key, "permission"))  # opened: report once
+        self.assertFalse(cb.allow(key))
+        self.assertEqual(cb.open_circuits()[key], (10, "permission"))
+
+        now[0] = 10  # probe allowed, fails again: re-open with doubled backoff, not re-reported
+        self.assertTrue(cb.allow(key))
+        self.assertFalse(cb.record_failure(key, "permission"))
+        self.assertEqual(cb.open_circuits()[key][0], 20)
+
+        now[0] = 30
+        cb.record_failure(key, "permission")
+        self.assertEqual(cb.open_circuits()[key][0], 25)  # capped
+
+    def test_success_resets(self):
+        cb = CircuitBreaker(threshold=1)
+        cb.record_failure("k")
+        self.assertFalse(cb.allow("k"))
+        cb.record_success("k")
+        self.assertTrue(cb.allow("k"))
+        self.assertTrue(cb.record_failure("k"))
+
+    def test_failures_while_open_are_ignored(self):
+        now = [0.0]
+        cb = CircuitBreaker(threshold=2, base_backoff=10, clock=lambda: now[0])
+        for _ in range(2):
+            cb.record_failure("k")
+        for _ in range(20):  # stragglers that were already in flight
+            self.assertFalse(cb.record_failure("k"))
+        self.assertEqual(cb.open_circuits()["k"][0], 10)
+
+    def test_one_probe_at_a_time(self):
+        now = [0.0]
+        cb = CircuitBreaker(threshold=1, base_backoff=10, clock=lambda: now[0])
+        cb.record_failure("k")
+        now[0] = 10
+        self.assertTrue(cb.allow("k"))
+        self.assertFalse(cb.allow("k"))  # the probe is still in flight
+        cb.record_success("k")
+        self.assertTrue(cb.allow("k"))
@@ -1,31 +1,202 @@
+import asyncio
+import threading
 import unittest
-import os, tempfile
-from app.storage.db import Database, utcnow
+import os, sqlite3, tempfile
+from app.storage.db import SCHEMA_VERSION, Database, utcnow
 
 class TestDB(unittest.IsolatedAsyncioTestCase):
+    wal = False
+
     async def asyncSetUp(self):
         self.tmp = tempfile.NamedTemporaryFile(delete=False)
         self.tmp.close()
-        self.db = Database(self.tmp.name)
+        self.db = Database(self.tmp.name, wal=self.wal)
         await self.db.connect()
 
     async def asyncTearDown(self):
         await self.db.close()
-        os.unlink(self.tmp.name)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.tmp.name + suffix):
+                os.unlink(self.tmp.name + suffix)
 
     async def test_profile_create(self):
-        p = await self.db.get_profile(1, 2)
+        p = await self.db.get_or_create_profile(1, 2)
         self.assertEqual(p.state, "通常")
         self.assertEqual(p.vc_autopost_enabled, 1)
         await self.db.update_state(1, 2, "元気")
-        p2 = await self.db.get_profile(1, 2)
+        p2 = await self.db.get_or_create_profile(1, 2)
         self.assertEqual(p2.state, "元気")
 
         await self.db.set_vc_autopost_enabled(1, 2, False)
-        p3 = await self.db.get_profile(1, 2)
+        p3 = await self.db.get_or_create_profile(1, 2)
         self.assertEqual(p3.vc_autopost_enabled, 0)
 
+    async def test_peek_profile_never_creates(self):
+        self.assertIsNone(await self.db.peek_profile(1, 2))
+        row = await self.db._fetchone("SELECT COUNT(*) AS n FROM profiles")
+        self.assertEqual(row["n"], 0)
+
+        await self.db.get_or_create_profile(1, 2)
+        await self.db.update_profile_fields(1, 2, name="n", condition="", hobby="", care="", one="")
+        # A second get_or_create must not reset an existing row.
+        p = await self.db.get_or_create_profile(1, 2)
+        self.assertEqual(p.name, "n")
+        peeked = await self.db.peek_profile(1, 2)
+        self.assertEqual(peeked, p)
+
     async def test_config(self):
         await self.db.set_guild_config(1, channel_id=10, log_channel_id=None)
         cfg = await self.db.get_guild_config(1)
         self.assertEqual(cfg.channel_id, 10)
+
+    async def test_guild_config_cache(self):
+        await self.db.set_guild_config(1, channel_id=10, log_channel_id=20)
+        await self.db.set_panel_message_id(1, 99)
+        before = self.db.guild_config_cache_stats()
+        cfg = await self.db.get_guild_config(1)
+        self.assertEqual((cfg.channel_id, cfg.log_channel_id, cfg.panel_message_id), (10, 20, 99))
+        stats = self.db.guild_config_cache_stats()
+        self.assertEqual(stats["hits"], before["hits"] + 1)
+        self.assertEqual(stats["misses"], before["misses"])
+
+        # Unknown guilds hit SQLite once, then are served from memory.
+        await self.db.get_guild_config(5)
+        await self.db.get_guild_config(5)
+        stats2 = self.db.guild_config_cache_stats()
+        self.assertEqual(stats2["misses"], stats["misses"] + 1)
+
+    async def test_guild_config_miss_does_not_overwrite_concurrent_write(self):
+        read_done = asyncio.Event()
+        release = asyncio.Event()
+        fetchone = self.db._fetchone
+
+        async def slow_fetchone(*args, **kwargs):
+            row = await fetchone(*args, **kwargs)  # snapshot taken before the write below
+            read_done.set()
+            await release.wait()
+            return row
+        self.db._fetchone = slow_fetchone
+
+        reader = asyncio.create_task(self.db.get_guild_config(7))
+        await read_done.wait()
+        await self.db.set_guild_config(7, channel_id=70, log_channel_id=None)
+        release.set()
+        await reader
+        self.assertEqual((await self.db.get_guild_config(7)).channel_id, 70)
+
+    async def test_is_stale_panel(self):
+        await self.db.set_guild_config(1, channel_id=10, log_channel_id=None)
+        self.assertFalse(self.db.is_stale_panel(1, 98))  # no panel recorded yet
+        await self.db.set_panel_message_id(1, 99)
+        self.assertTrue(self.db.is_stale_panel(1, 98))
+        self.assertFalse(self.db.is_stale_panel(1, 99))
+        self.assertFalse(self.db.is_stale_panel(2, 98))
+
+    async def test_guild_config_cache_loaded_on_connect(self):
+        await self.db.set_guild_config(1, channel_id=10, log_channel_id=None)
+        await self.db.set_panel_message_id(1, 99)
+        await self.db.close()
+        self.db = Database(self.tmp.name, wal=self.wal)
+        await self.db.connect()
+        cfg = await self.db.get_guild_config(1)
+        self.assertEqual((cfg.channel_id, cfg.panel_message_id), (10, 99))
+        self.assertEqual(self.db.guild_config_cache_stats()["misses"], 0)
+
+    async def test_profile_channel_index(self):
+        await self.db.set_guild_config(1, channel_id=10, log_channel_id=None)
+        self.assertEqual(self.db.guild_for_profile_channel(10), 1)
+        self.assertIsNone(self.db.guild_for_profile_channel(11))
+
+        # Re-running setup with another channel drops the old entry.
+        await self.db.set_guild_config(1, channel_id=11, log_channel_id=None)
+        self.assertIsNone(self.db.guild_for_profile_channel(10))
+        self.assertEqual(self.db.guild_for_profile_channel(11), 1)
+
+    async def test_query_stats(self):
+        await self.db.set_guild_config(1, channel_id=10, log_channel_id=None)
+        await self.db.get_or_create_profile(1, 2)
+        stats = self.db.query_stats.snapshot()
+        self.assertEqual(stats["set_guild_config"]["count"], 1)
+        self.assertGreaterEqual(stats["get_or_create_profile"]["count"], 1)
+        self.assertLessEqual(stats["get_or_create_profile"]["p50_ms"], stats["get_or_create_profile"]["p99_ms"])
+        self.assertIn("set_guild_config: count=1", self.db.format_query_stats())
+
+    async def test_writes_run_on_dedicated_thread(self):
+        names = set()
+        for _ in range(3):
+            await self.db._exec("SELECT 1")
+            names.add(await self.db._submit(self.db._executor, lambda: threading.current_thread().name, "thread_name"))
+        self.assertEqual(len(names), 1)
+        self.assertTrue(names.pop().startswith("cookie-db"))
+
+    async def test_transaction_commits_once(self):
+        async with self.db.transaction(name="save") as tx:
+            await self.db.ensure_profile(1, 2, tx=tx)
+            await self.db.update_profile_fields(1, 2, name="n", condition="c", hobby="h", care="", one="", tx=tx)
+            await self.db.set_guild_config(1, channel_id=10, log_channel_id=None, tx=tx)
+            await self.db.set_panel_message_id(1, 99, tx=tx)
+        stats = self.db.query_stats.snapshot()
+        self.assertEqual(stats["save"]["count"], 1)
+        self.assertNotIn("update_profile_fields", stats)
+        p = await self.db.get_or_create_profile(1, 2)
+        self.assertEqual((p.name, p.condition, p.hobby), ("n", "c", "h"))
+        cfg = await self.db.get_guild_config(1)
+        self.assertEqual((cfg.channel_id, cfg.panel_message_id), (10, 99))
+
+    async def test_transaction_rolls_back(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            async with self.db.transaction() as tx:
+                await self.db.set_guild_config(1, channel_id=10, log_channel_id=None, tx=tx)
+                tx.execute("INSERT INTO no_such_table VALUES(1)")
+        # Neither SQLite nor the config cache saw the first statement.
+        row = await self.db._fetchone("SELECT COUNT(*) AS n FROM guild_config")
+        self.assertEqual(row["n"], 0)
+        self.assertIsNone(self.db.guild_for_profile_channel(10))
+
+    async def test_migrate_is_idempotent(self):
+        await self.db.get_or_create_profile(1, 2)
+        await self.db._migrate()
+        p = await self.db.get_or_create_profile(1, 2)
+        self.assertEqual(p.state, "通常")
+
+    async def test_migrations_run_once(self):
+        version = self.db.conn.execute("PRAGMA user_version").fetchone()[0]
+        self.assertEqual(version, SCHEMA_VERSION)
+        await self.db.ensure_profile(1, 2)
+        await self.db.update_state(1, 2, "好調")  # a legacy label the baseline migration rewrites
+        await self.db._migrate()
+        p = await self.db.peek_profile(1, 2)
+        self.assertEqual(p.state, "好調")  # not re-run on an up-to-date database
+
+    async def test_unversioned_database_is_upgraded(self):
+        await self.db.close()
+        conn = sqlite3.connect(self.tmp.name)
+        conn.execute("DROP TABLE profiles")
+        conn.execute("DROP TABLE guild_config")
+        conn.execute("CREATE TABLE guild_config(guild_id INTEGER PRIMARY KEY, panel_channel_id INTEGER)")
+        conn.execute("INSERT INTO guild_config VALUES(1, 10)")
+        conn.execute("PRAGMA user_version=0")
+        conn.commit()
+        conn.close()
+
+        self.db = Database(self.tmp.name, wal=self.wal)
+        await self.db.connect()
+        cfg = await self.db.get_guild_config(1)
+        self.assertEqual(cfg.channel_id, 10)
+        self.assertEqual(self.db.conn.execute("PRAGMA user_version").fetchone()[0], SCHEMA_VERSION)
+
+
+class TestDBWal(TestDB):
+    wal = True
+
+    async def test_wal_reads_do_not_wait_for_writer(self):
+        row = await self.db._fetchone("PRAGMA journal_mode")
+        self.assertEqual(row[0], "wal")
+        await self.db.set_guild_config(1, channel_id=10, log_channel_id=None)
+        async with self.db._lock:
+            # The writer lock is held, yet reads still complete on the reader pool.
+            row = await asyncio.wait_for(
+                self.db._fetchone("SELECT channel_id FROM guild_config WHERE guild_id=?", (1,)),
+                timeout=2,
+            )
+        self.assertEqual(row["channel_id"], 10)
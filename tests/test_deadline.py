@@ -0,0 +1,120 @@
+import asyncio
+import unittest
+from datetime import timedelta
+
+import discord
+
+from app.discord_app.deadline import DeferStats, ResponseBudget
+
+
+class FakeResponse:
+    def __init__(self, calls):
+        self.calls = calls
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def defer(self, **kwargs):
+        self.calls.append("defer")
+        self.done = True
+
+    async def send_message(self, **kwargs):
+        self.calls.append("send_message")
+        self.done = True
+
+
+class FakeFollowup:
+    def __init__(self, calls):
+        self.calls = calls
+
+    async def send(self, **kwargs):
+        self.calls.append("followup")
+
+
+class FakeInteraction:
+    def __init__(self, lag: float = 0.0):
+        self.created_at = discord.utils.utcnow() - timedelta(seconds=lag)
+        self.calls: list[str] = []
+        self.response = FakeResponse(self.calls)
+        self.followup = FakeFollowup(self.calls)
+
+
+class TestResponseBudget(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.now = [0.0]
+        self.stats = DeferStats()
+
+    def budget(self, inter, **kw):
+        return ResponseBudget(inter, "h", self.stats, clock=lambda: self.now[0], **kw)
+
+    async def test_fast_path_responds_directly(self):
+        inter = FakeInteraction()
+        b = self.budget(inter)
+        async with b.step("db"):
+            self.now[0] += 0.1
+        await b.send("ok")
+        self.assertEqual(inter.calls, ["send_message"])
+        self.assertEqual(self.stats.snapshot()["h"], {"calls": 1, "deferred": 0, "late": 0})
+
+    async def test_budget_counts_lag_since_interaction_creation(self):
+        self.stats.observe("h", "db", 0.6)
+        inter = FakeInteraction(lag=1.5)  # arrived 1.5s after Discord created it
+        b = self.budget(inter)
+        self.assertGreaterEqual(b.elapsed, 1.5)
+        async with b.step("db"):  # 1.5 + 0.6 >= 2.0: defer up front
+            self.now[0] += 0.6
+        await b.send("ok")
+        self.assertEqual(inter.calls, ["defer", "followup"])
+
+        b = self.budget(FakeInteraction(lag=3.5))
+        await b.send("ok")
+        self.assertEqual(self.stats.snapshot()["h"]["late"], 1)
+
+    async def test_slow_step_defers_next_time_and_uses_followup(self):
+        inter = FakeInteraction()
+        b = self.budget(inter)
+        async with b.step("db"):
+            self.now[0] += 2.5  # first time nobody knew this step was slow
+        await b.send("ok")
+        self.assertEqual(inter.calls, ["send_message"])
+
+        inter = FakeInteraction()
+        b = self.budget(inter)
+        async with b.step("db"):  # projected 0 + 2.5 >= 2.0: defer up front
+            self.now[0] += 2.5
+        await b.send("ok")
+        self.assertEqual(inter.calls, ["defer", "followup"])
+        self.assertEqual(self.stats.snapshot()["h"]["deferred"], 1)
+
+    async def test_step_without_history_defers_when_threshold_passes(self):
+        inter = FakeInteraction()
+        b = ResponseBudget(inter, "h", self.stats, defer_at=0.05)  # real clock: the timer must fire
+        async with b.step("db"):
+            await asyncio.sleep(0.1)  # nothing learned yet, so nothing deferred up front
+            self.assertEqual(inter.calls, ["defer"])
+        await b.send("ok")
+        self.assertEqual(inter.calls, ["defer", "followup"])
+        self.assertEqual(self.stats.snapshot()["h"]["deferred"], 1)
+
+    async def test_fast_step_cancels_timer(self):
+        inter = FakeInteraction()
+        b = ResponseBudget(inter, "h", self.stats, defer_at=0.05)
+        async with b.step("db"):
+            pass
+        await asyncio.sleep(0.1)
+        await b.send("ok")
+        self.assertEqual(inter.calls, ["send_message"])
+
+    async def test_late_response_is_counted(self):
+        inter = FakeInteraction()
+        b = self.budget(inter, can_defer=False)
+        async with b.step("db"):
+            self.now[0] += 3.5
+        await b.send("ok")
+        self.assertEqual(self.stats.snapshot()["h"]["late"], 1)
+
+    def test_estimate_decays_slowly(self):
+        self.stats.observe("h", "db", 2.0)
+        self.stats.observe("h", "db", 0.0)
+        self.assertAlmostEqual(self.stats.estimate("h", "db"), 1.6)
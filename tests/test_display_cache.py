@@ -0,0 +1,40 @@
+import unittest
+
+from app.services.display_cache import DisplayCache
+
+class TestDisplayCache(unittest.TestCase):
+    def test_ttl_and_negative_ttl(self):
+        now = [0.0]
+        cache = DisplayCache(ttl=100, negative_ttl=10, clock=lambda: now[0])
+        cache.put(1, 2, ("name", None))
+        cache.put(1, 3, None)
+        self.assertEqual(cache.get(1, 2), (True, ("name", None)))
+        self.assertEqual(cache.get(1, 3), (True, None))
+        now[0] = 11
+        self.assertEqual(cache.get(1, 3), (False, None))
+        self.assertEqual(cache.get(1, 2), (True, ("name", None)))
+        now[0] = 101
+        self.assertEqual(cache.get(1, 2), (False, None))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (3, 2))
+
+    def test_lru_bound(self):
+        cache = DisplayCache(max_entries=2)
+        cache.put(1, 1, ("a", None))
+        cache.put(1, 2, ("b", None))
+        cache.get(1, 1)
+        cache.put(1, 3, ("c", None))
+        self.assertIn((1, 1), cache)
+        self.assertNotIn((1, 2), cache)
+
+    def test_not_member_marks_expire_and_invalidate(self):
+        now = [0.0]
+        cache = DisplayCache(negative_ttl=10, clock=lambda: now[0])
+        cache.mark_not_member(1, 2)
+        self.assertTrue(cache.is_not_member(1, 2))
+        self.assertFalse(cache.is_not_member(1, 3))
+        now[0] = 10
+        self.assertFalse(cache.is_not_member(1, 2))
+        cache.mark_not_member(1, 2)
+        cache.invalidate(1, 2)  # e.g. they rejoined and changed their name
+        self.assertFalse(cache.is_not_member(1, 2))
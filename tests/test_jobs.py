@@ -0,0 +1,44 @@
+import asyncio
+import unittest
+
+from app.services.jobs import JobQueue
+
+class TestJobQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_per_guild_order_and_drain(self):
+        q = JobQueue(workers=2)
+        q.start()
+        done: list[tuple[int, int]] = []
+
+        def job(gid, i):
+            async def run():
+                await asyncio.sleep(0.001 * (5 - i))  # later jobs are faster: order must still hold
+                done.append((gid, i))
+            return run
+
+        for i in range(5):
+            for gid in (1, 2, 3):
+                q.submit(gid, "t", job(gid, i))
+        await q.stop()
+        for gid in (1, 2, 3):
+            self.assertEqual([i for g, i in done if g == gid], list(range(5)))
+        self.assertEqual((q.pending, q.completed), (0, 15))
+
+    async def test_full_lane_drops(self):
+        q = JobQueue(workers=1, max_pending=2)
+
+        async def noop():
+            pass
+        results = [q.submit(1, "t", noop) for _ in range(4)]
+        self.assertEqual(results, [True, True, False, False])
+        self.assertEqual(q.metrics()["dropped"], 2)
+        self.assertEqual(q.metrics()["high_water"], 2)
+
+    async def test_failure_is_counted(self):
+        q = JobQueue(workers=1)
+        q.start()
+
+        async def boom():
+            raise RuntimeError("x")
+        q.submit(1, "boom", boom)
+        await q.stop()
+        self.assertEqual((q.failed, q.completed), (1, 0))
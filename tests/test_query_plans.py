@@ -0,0 +1,94 @@
+import inspect
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import timedelta
+
+from app.storage.db import Database, utcnow
+
+# Queries that read a whole (small or bounded) table on purpose.
+FULL_READS = {
+    "SELECT * FROM guild_config",  # startup cache load
+    "SELECT scope, tree_hash FROM command_sync_state",  # one row per synced scope
+}
+# scheduled_delete_stats counts every pending row; scanning the delete_at index is the best it can do.
+INDEX_SCANS = {"scheduled_deletes"}
+NOT_QUERIES = ("BEGIN", "COMMIT", "ROLLBACK", "PRAGMA")
+
+
+class TestQueryPlans(unittest.IsolatedAsyncioTestCase):
+    """Every statement Database issues must be answered through an index, not a table scan."""
+
+    async def asyncSetUp(self):
+        self.tmp = tempfile.NamedTemporaryFile(delete=False)
+        self.tmp.close()
+        self.db = Database(self.tmp.name)
+        await self.db.connect()
+        self.statements: list[str] = []
+        self.db.conn.set_trace_callback(self.statements.append)
+
+    async def asyncTearDown(self):
+        await self.db.close()
+        os.unlink(self.tmp.name)
+
+    async def _exercise(self) -> set[str]:
+        db = self.db
+        later = utcnow() + timedelta(minutes=5)
+        calls = {
+            "set_guild_config": lambda: db.set_guild_config(1, channel_id=10, log_channel_id=20),
+            "set_panel_message_id": lambda: db.set_panel_message_id(1, 99),
+            "get_guild_config": lambda: db.get_guild_config(2),  # uncached: goes to SQLite
+            "get_or_create_profile": lambda: db.get_or_create_profile(1, 2),
+            "ensure_profile": lambda: db.ensure_profile(1, 3),
+            "peek_profile": lambda: db.peek_profile(1, 2),
+            "update_profile_fields": lambda: db.update_profile_fields(1, 2, name="n", condition="", hobby="", care="", one=""),
+            "update_state": lambda: db.update_state(1, 2, "元気"),
+            "set_public_message_id": lambda: db.set_public_message_id(1, 2, 500, content_hash="h"),
+            "set_public_content_hash": lambda: db.set_public_content_hash(1, 2, "h2"),
+            "set_vc_autopost_enabled": lambda: db.set_vc_autopost_enabled(1, 2, False),
+            "list_public_profiles_for_refresh": lambda: db.list_public_profiles_for_refresh(1, after_message_id=0, limit=25),
+            "get_profile_refresh_cursor": lambda: db.get_profile_refresh_cursor(1),
+            "set_profile_refresh_cursor": lambda: db.set_profile_refresh_cursor(1, 500),
+            "get_command_sync_hashes": lambda: db.get_command_sync_hashes(),
+            "set_command_sync_hash": lambda: db.set_command_sync_hash("global", "abc"),
+            "schedule_delete": lambda: db.schedule_delete(1, 10, 700, later),
+            "due_deletes": lambda: db.due_deletes(50),
+            "next_delete_at": lambda: db.next_delete_at(),
+            "scheduled_delete_stats": lambda: db.scheduled_delete_stats(),
+            "remove_scheduled_delete": lambda: db.remove_scheduled_delete(1, 10, 700),
+            "remove_scheduled_deletes": lambda: db.remove_scheduled_deletes([(1, 10, 701), (1, 10, 702)]),
+        }
+        for call in calls.values():
+            await call()
+        return set(calls)
+
+    def _plan(self, conn: sqlite3.Connection, sql: str) -> list[str]:
+        return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+
+    async def test_every_query_uses_an_index(self):
+        covered = await self._exercise()
+        public = {
+            name for name, fn in inspect.getmembers(Database, inspect.iscoroutinefunction)
+            if not name.startswith("_") and name not in ("connect", "close")
+        }
+        self.assertEqual(public - covered, set(), "new Database methods must be exercised here")
+
+        conn = sqlite3.connect(self.tmp.name)
+        try:
+            checked = 0
+            for sql in dict.fromkeys(" ".join(s.split()) for s in self.statements):
+                if sql.upper().startswith(NOT_QUERIES) or sql in FULL_READS:
+                    continue
+                checked += 1
+                for detail in self._plan(conn, sql):
+                    self.assertNotIn("TEMP B-TREE", detail, f"sort without index: {sql}")
+                    if detail.startswith("SCAN "):
+                        table = detail.split()[1]
+                        self.assertTrue(
+                            table in INDEX_SCANS and "INDEX" in detail,
+                            f"full table scan ({detail}): {sql}",
+                        )
+            self.assertGreater(checked, 20)
+        finally:
+            conn.close()
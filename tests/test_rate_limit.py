@@ -6,3 +6,28 @@ class TestRateLimiter(unittest.TestCase):
         rl = RateLimiter()
         self.assertTrue(rl.allow(1, 2, "state_change"))
         self.assertFalse(rl.allow(1, 2, "state_change"))
+
+    def test_window_expires(self):
+        now = [0.0]
+        rl = RateLimiter(clock=lambda: now[0])
+        self.assertTrue(rl.allow(1, 2, "state_change"))
+        now[0] = 19.0
+        self.assertFalse(rl.allow(1, 2, "state_change"))
+        now[0] = 20.0
+        self.assertTrue(rl.allow(1, 2, "state_change"))
+
+    def test_expired_entries_are_evicted(self):
+        now = [0.0]
+        rl = RateLimiter(clock=lambda: now[0])
+        for uid in range(100):
+            rl.allow(1, uid, "modal_save")
+        self.assertEqual(len(rl._last), 100)
+        now[0] = 61.0
+        rl.allow(1, 1000, "modal_save")
+        self.assertEqual(len(rl._last), 1)
+
+    def test_max_entries(self):
+        rl = RateLimiter(max_entries=10)
+        for uid in range(50):
+            rl.allow(1, uid, "modal_save")
+        self.assertEqual(len(rl._last), 10)
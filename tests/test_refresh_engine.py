@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+
+from app.services.refresh_engine import RefreshBatch, RefreshEngine
+
+class TestRefreshEngine(unittest.IsolatedAsyncioTestCase):
+    async def test_round_robin_until_every_guild_wraps(self):
+        remaining = {1: 3, 2: 1}
+        calls = []
+
+        async def refresh_batch(gid, limit):
+            calls.append(gid)
+            remaining[gid] -= 1
+            return RefreshBatch(visited=limit, edited=1, wrapped=remaining[gid] == 0)
+
+        engine = RefreshEngine(lambda: [1, 2], refresh_batch, batch_size=5, profiles_per_sec=0)
+        await engine.run_pass()
+        self.assertEqual(calls, [1, 2, 1, 1])
+        m = engine.metrics()
+        self.assertEqual((m["passes"], m["last_pass_profiles"], m["last_pass_edited"]), (1, 20, 4))
+
+    async def test_failing_guild_does_not_stall_pass(self):
+        async def refresh_batch(gid, limit):
+            if gid == 1:
+                raise RuntimeError("boom")
+            return RefreshBatch(visited=1, edited=0, wrapped=True)
+
+        engine = RefreshEngine(lambda: [1, 2], refresh_batch, profiles_per_sec=0)
+        await engine.run_pass()
+        self.assertEqual(engine.passes, 1)
+
+    async def test_first_pass_waits_until_ready(self):
+        ready = asyncio.Event()
+        calls = []
+
+        async def refresh_batch(gid, limit):
+            calls.append(gid)
+            return RefreshBatch(visited=0, edited=0, wrapped=True)
+
+        engine = RefreshEngine(lambda: [1], refresh_batch, profiles_per_sec=0, wait_ready=ready.wait)
+        engine.start()
+        await asyncio.sleep(0.01)
+        self.assertEqual(calls, [])
+        ready.set()
+        await asyncio.sleep(0.01)
+        self.assertEqual(calls, [1])
+        await engine.stop()
@@ -0,0 +1,144 @@
+import asyncio
+import unittest
+
+from app.services.scheduler import CoalescingWorker, Debouncer, TimerHeap
+
+class TestTimerHeap(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.fired = []
+
+        async def handler(key, value):
+            self.fired.append((key, value))
+
+        self.timers = TimerHeap(handler)
+        self.timers.start()
+
+    async def asyncTearDown(self):
+        await self.timers.stop()
+
+    async def test_fires_in_time_order(self):
+        self.timers.schedule("b", 0.05, 2)
+        self.timers.schedule("a", 0.01, 1)
+        self.assertEqual(self.timers.depth, 2)
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.fired, [("a", 1), ("b", 2)])
+        self.assertEqual(self.timers.depth, 0)
+
+    async def test_reschedule_replaces_entry(self):
+        self.timers.schedule("a", 0.01, 1)
+        self.timers.schedule("a", 0.03, 2)
+        self.assertEqual(self.timers.depth, 1)
+        await asyncio.sleep(0.08)
+        self.assertEqual(self.fired, [("a", 2)])
+
+    async def test_cancel(self):
+        self.timers.schedule("a", 0.01, 1)
+        self.assertTrue(self.timers.cancel("a"))
+        self.assertFalse(self.timers.cancel("a"))
+        await asyncio.sleep(0.05)
+        self.assertEqual(self.fired, [])
+
+    async def test_dead_entries_are_compacted(self):
+        for i in range(1000):
+            self.timers.schedule("a", 10, i)
+        self.assertEqual(self.timers.depth, 1)
+        self.assertLess(self.timers.heap_size, 200)
+
+
+class TestDebouncer(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+
+        async def action(key):
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            await asyncio.sleep(0.03)
+            self.calls.append(key)
+            self.active -= 1
+
+        self.deb = Debouncer(action, quiet=0.03, max_delay=0.2)
+        self.deb.start()
+
+    async def asyncTearDown(self):
+        await self.deb.stop()
+
+    async def test_burst_fires_once_after_quiet(self):
+        for _ in range(10):
+            self.deb.request(1)
+            await asyncio.sleep(0.005)
+        self.assertEqual(self.calls, [])
+        await asyncio.sleep(0.12)
+        self.assertEqual(self.calls, [1])
+        self.assertEqual((self.deb.requested, self.deb.fired), (10, 1))
+
+    async def test_max_delay_caps_continuous_traffic(self):
+        for _ in range(30):
+            self.deb.request(1)
+            await asyncio.sleep(0.01)
+        self.assertGreaterEqual(len(self.calls), 1)
+
+    async def test_min_interval_spaces_fires_for_spaced_requests(self):
+        fired_at = []
+
+        async def action(key):
+            fired_at.append(asyncio.get_running_loop().time())
+
+        # Scaled-down panel bump: messages 6s apart against quiet=5s and a 30s minimum interval.
+        deb = Debouncer(action, quiet=0.02, max_delay=0.12, min_interval=0.12)
+        deb.start()
+        try:
+            for _ in range(16):
+                deb.request(1)
+                await asyncio.sleep(0.025)
+            await asyncio.sleep(0.15)
+        finally:
+            await deb.stop()
+        self.assertLessEqual(len(fired_at), 5)  # without the interval: one fire per request
+        gaps = [b - a for a, b in zip(fired_at, fired_at[1:])]
+        self.assertTrue(all(g >= 0.11 for g in gaps), gaps)
+
+    async def test_single_in_flight_per_key(self):
+        self.deb.request(1)
+        await asyncio.sleep(0.04)  # action now running
+        self.deb.request(1)
+        self.deb.request(1)
+        await asyncio.sleep(0.2)
+        self.assertEqual(self.calls, [1, 1])
+
+    async def test_request_before_fired_task_starts_does_not_overlap(self):
+        deb = Debouncer(self.deb._action, quiet=0, max_delay=0)
+        deb.start()
+        try:
+            first = asyncio.create_task(deb._fire(1, None))  # timer popped, task not started yet
+            deb.request(1)  # sees nothing running: schedules another immediate fire
+            await asyncio.sleep(0.15)
+            await first
+            self.assertEqual(self.calls, [1, 1])
+            self.assertEqual(self.max_active, 1)
+        finally:
+            await deb.stop()
+        self.assertEqual(self.max_active, 1)
+
+
+class TestCoalescingWorker(unittest.IsolatedAsyncioTestCase):
+    async def test_marks_coalesce_after_settle(self):
+        handled = []
+
+        async def handler(key):
+            handled.append(key)
+
+        worker = CoalescingWorker(handler, settle=0.03, max_delay=1.0)
+        worker.start()
+        try:
+            for _ in range(5):
+                worker.mark((1, 2))
+                worker.mark((1, 3))
+                await asyncio.sleep(0.005)
+            self.assertEqual(handled, [])
+            await asyncio.sleep(0.1)
+            self.assertEqual(sorted(handled), [(1, 2), (1, 3)])
+            self.assertEqual((worker.marked, worker.handled, worker.pending), (10, 2, 0))
+        finally:
+            await worker.stop()
@@ -2,7 +2,7 @@ import unittest
 from datetime import datetime, timezone
 
 from app.models import ProfileData
-from app.services.vc_autopost import should_autopost
+from app.services.vc_autopost import AutoPostBatcher, VCAutoPostLimiter, should_autopost
 
 class TestVCAutoPost(unittest.TestCase):
     def _profile(self, enabled: int) -> ProfileData:
@@ -29,3 +29,29 @@ class TestVCAutoPost(unittest.TestCase):
     def test_should_autopost_off(self):
         prof = self._profile(0)
         self.assertFalse(should_autopost(prof))
+
+
+class TestVCAutoPostLimiter(unittest.TestCase):
+    def test_cooldowns_and_eviction(self):
+        now = [0.0]
+        lim = VCAutoPostLimiter(global_cooldown_sec=300, vc_cooldown_sec=600, clock=lambda: now[0])
+        self.assertTrue(lim.allow(1, 2, 3))
+        now[0] = 301.0
+        self.assertFalse(lim.allow(1, 2, 3))  # same VC still cooling down
+        self.assertTrue(lim.allow(1, 2, 4))
+        now[0] = 2000.0
+        self.assertTrue(lim.allow(1, 9, 9))
+        self.assertEqual(len(lim._last_global), 1)
+        self.assertEqual(len(lim._last_vc), 1)
+
+
+class TestAutoPostBatcher(unittest.TestCase):
+    def test_full_batch_is_returned(self):
+        b = AutoPostBatcher(max_items=3)
+        self.assertIsNone(b.add(1, "a"))
+        self.assertIsNone(b.add(2, "x"))
+        self.assertIsNone(b.add(1, "b"))
+        self.assertEqual(b.add(1, "c"), ["a", "b", "c"])
+        self.assertEqual(b.pending(1), 0)
+        self.assertEqual(b.take(2), ["x"])
+        self.assertEqual(b.take(2), [])